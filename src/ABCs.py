@@ -1,16 +1,44 @@
 import abc
 from abc import ABC, abstractmethod
 import asyncio
-from typing import Any
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 队列满时的处理策略
+QUEUE_POLICIES = ("block", "drop_new", "drop_oldest")
 
 class AsyncModule(ABC):
     """异步工作模块的抽象基类
     特征：工作是异步的，没有直接的返回值，运行即效果，可能需要等待时间
+    基类提供任务队列和工作协程：有界队列、队列满时的策略、多个并发worker、单任务超时、关闭时排空队列，以及队列指标。
+    子类只需实现 _process_task 处理单个任务，由 start_workers 启动worker。
     """
-    def __init__(self):
+    def __init__(self, max_queue_size: int = 0, queue_policy: str = "block", num_workers: int = 1,
+                 task_timeout: Optional[float] = None, latency_window: int = 1000):
+        """
+        Args:
+            max_queue_size (int): 队列容量，0表示不限。
+            queue_policy (str): 队列满时的策略：block 等待空位（反压），drop_new 丢弃新任务，drop_oldest 丢弃最旧的任务。
+            num_workers (int): 并发处理任务的worker数量，任务处理不能并发时保持为1。
+            task_timeout (Optional[float]): 单个任务的超时时间（秒），为空不限。超时会取消正在执行的 _process_task，
+                子类需保证被取消后连接等状态仍可用（例如请求已发出而回复未读时重建连接）。
+            latency_window (int): 计算延迟分布时保留的最近任务数。
+        """
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy '{queue_policy}', available: {QUEUE_POLICIES}.")
         self._is_ready = asyncio.Event()
-        self._task_queue = asyncio.Queue()
-        pass
+        self._task_queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.queue_policy = queue_policy
+        self.num_workers = num_workers
+        self.task_timeout = task_timeout
+        self._workers: List[asyncio.Task] = []
+        self._accepting = True
+        # shutdown_workers 停止worker后置位，此后仍在 put 上等待的生产者放入的任务不会再被处理
+        self._closed = False
+        self._counters = {"enqueued": 0, "processed": 0, "dropped": 0, "timeouts": 0, "errors": 0}
+        # 每个任务的 (排队等待时间, 总延迟)，单位秒
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=latency_window)
 
     @abstractmethod
     async def _setup(self):
@@ -22,32 +50,117 @@ class AsyncModule(ABC):
             self._is_ready.set()
         """
         pass
-    
-    @abstractmethod
-    async def enqueue_task(self, task: Any) -> None:
+
+    async def enqueue_task(self, task: Any) -> bool:
         """
         将任务加入队列，task处传任务参数，异步处理
         任务一般直接产生结果，无返回值
-        示例：
-        self._task_queue.put_nowait(task)
+        Returns:
+            bool: 任务是否被接受，按 queue_policy 丢弃或模块正在关闭时为False。
         """
-        pass
-    
+        if not self._accepting:
+            self._counters["dropped"] += 1
+            return False
+        item = (time.perf_counter(), task)
+        if self._task_queue.full():
+            if self.queue_policy == "drop_new":
+                self._counters["dropped"] += 1
+                return False
+            if self.queue_policy == "drop_oldest":
+                self._task_queue.get_nowait()
+                self._task_queue.task_done()
+                self._counters["dropped"] += 1
+        await self._task_queue.put(item)
+        if self._closed:
+            # 在 put 上等待期间模块已关闭，worker不会再处理这个任务
+            self._drop_queued()
+            return False
+        self._counters["enqueued"] += 1
+        return True
+
     @abstractmethod
-    async def process_task(self) -> None:
+    async def _process_task(self, task: Any) -> None:
         """
-        开启处理任务的循环，具体任务处理放在_process_task，或如果任务简单则直接在这里实现
-        示例：
-        while not self._task_queue.empty():
-            task = await self._task_queue.get()
-            await self._process_task(task)
+        处理单个任务，由worker调用，异常和超时由基类记录，不会中断worker
         """
         pass
-    
+
+    def start_workers(self) -> List[asyncio.Task]:
+        """启动 num_workers 个worker，重复调用返回同一组任务。"""
+        if not self._workers:
+            self._accepting = True
+            self._closed = False
+            self._workers = [asyncio.create_task(self._worker_loop()) for _ in range(self.num_workers)]
+        return list(self._workers)
+
+    async def process_task(self) -> None:
+        """
+        开启处理任务的循环，直到worker被取消
+        """
+        await asyncio.gather(*self.start_workers())
+
+    async def _worker_loop(self):
+        while True:
+            enqueued_at, task = await self._task_queue.get()
+            started_at = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._process_task(task), timeout=self.task_timeout)
+                self._counters["processed"] += 1
+            except asyncio.TimeoutError:
+                self._counters["timeouts"] += 1
+                print(f"{type(self).__name__}: task {task!r} timed out after {self.task_timeout}s.")
+            except Exception as e:
+                self._counters["errors"] += 1
+                print(f"{type(self).__name__}: error processing task {task!r}: {e}")
+            finally:
+                self._latencies.append((started_at - enqueued_at, time.perf_counter() - enqueued_at))
+                self._task_queue.task_done()
+
+    async def join(self):
+        """等待当前队列中的任务全部处理完。"""
+        await self._task_queue.join()
+
+    async def shutdown_workers(self, drain: bool = True, timeout: Optional[float] = 5.0):
+        """
+        停止接受新任务并停止worker。drain 为真时先等待队列中已有的任务处理完（最多 timeout 秒），
+        worker未启动时不等待，剩余任务被丢弃并计入 dropped。在 put 上等待的生产者随后返回False。
+        """
+        self._accepting = False
+        if drain and self._workers:
+            try:
+                await asyncio.wait_for(self._task_queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"{type(self).__name__}: drain timed out with {self._task_queue.qsize()} tasks left.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._closed = True
+        self._drop_queued()
+
+    def _drop_queued(self):
+        """丢弃队列中剩余的任务，计入 dropped。"""
+        while not self._task_queue.empty():
+            self._task_queue.get_nowait()
+            self._task_queue.task_done()
+            self._counters["dropped"] += 1
+
+    def queue_metrics(self) -> Dict[str, Any]:
+        """队列深度、计数和延迟分布（毫秒）：wait 为排队等待时间，total 为入队到处理完成的时间。"""
+        metrics: Dict[str, Any] = {"depth": self._task_queue.qsize(), "max_size": self._task_queue.maxsize,
+                                   "workers": len(self._workers), **self._counters}
+        for index, name in enumerate(("wait", "total")):
+            values = sorted(latency[index] for latency in self._latencies)
+            if values:
+                pick = lambda q: round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 3)
+                metrics[f"{name}_ms"] = {"mean": round(sum(values) / len(values) * 1000, 3),
+                                         "p50": pick(0.5), "p99": pick(0.99), "max": round(values[-1] * 1000, 3)}
+        return metrics
+
     @abstractmethod
     async def shutdown(self) -> None:
         """
-        关闭模块
+        关闭模块，一般先调用 shutdown_workers 排空队列，再释放连接等资源
         """
         pass
 
@@ -1,18 +1,36 @@
-import pyvts
 import asyncio
+import json
+from typing import Dict, Optional, Sequence
 from ABCs import AsyncModule
+from parameter_stream import EnvelopeProducer, ParameterProducer, ParameterStream, StaticProducer
 
 class AvatarModule(AsyncModule):
-    def __init__(self):
-        super().__init__()
-        self.vts = pyvts.vts()
-        self.task_queue = asyncio.Queue()
+    def __init__(self, vts_host: str = "localhost", vts_port: int = 8001, token_path: str = "./pyvts_token.txt",
+                 parameter_fps: float = 60.0, motion_queue_size: int = 8, motion_timeout: float = 2.0):
+        # 热键请求共用一个连接，不能并发，只用一个worker；积压的旧动作已无意义，队列满时丢弃最旧的
+        super().__init__(max_queue_size=motion_queue_size, queue_policy="drop_oldest", num_workers=1,
+                         task_timeout=motion_timeout)
+        import pyvts # 仅在创建模块时导入，避免拖慢不需要虚拟形象的进程启动
+        plugin_info = dict(pyvts.config.plugin_default, authentication_token_path=token_path)
+        vts_api_info = {"version": "1.0", "name": "VTubeStudioPublicAPI", "host": vts_host, "port": vts_port}
+        self.vts = pyvts.vts(plugin_info=plugin_info, vts_api_info=vts_api_info)
+        # 参数流使用独立连接：pyvts的请求在同一连接上先发后收，共用连接会让口型帧和热键互相阻塞
+        self.parameter_vts = pyvts.vts(plugin_info=plugin_info, vts_api_info=vts_api_info)
         self.hotkey_list = []
-        self._shutdown = asyncio.Event()
+        self._hotkey_connection_stale = False # 热键连接上可能残留未读的回复，下次请求前需重建连接
+
+        # 口型由振幅包络驱动，表情等持续参数由 expression 保持
+        self.mouth = EnvelopeProducer("MouthOpen")
+        self.expression = StaticProducer()
+        self.parameter_stream = ParameterStream(self._inject_parameters, fps=parameter_fps,
+                                                producers=[self.expression, self.mouth])
+        self._parameter_task: Optional[asyncio.Task] = None
+        self._parameter_reply_task: Optional[asyncio.Task] = None
 
     async def _setup(self):
         if not self._is_ready.is_set():
             await self.connect_auth(self.vts)
+            await self.connect_auth(self.parameter_vts)
             await self.get_hotkey_list(self.vts)
             self._is_ready.set()
 
@@ -29,24 +47,75 @@ class AvatarModule(AsyncModule):
             self.hotkey_list.append(hotkey["name"])
         return self.hotkey_list
     
-    async def enqueue_task(self, motion_name: str):
-        self.task_queue.put_nowait(motion_name)
-    
-    async def process_task(self):
-        while not self._shutdown.is_set():
-            motion_name = await self.task_queue.get()
+    async def reconnect(self, myvts):
+        """关闭并重新建立连接和认证，丢弃连接上未读的回复。"""
+        try:
+            await myvts.close()
+        except Exception as e:
+            print(f"Error closing VTS connection: {e}")
+        await self.connect_auth(myvts)
+
+    async def _process_task(self, motion_name: str):
+        if self._hotkey_connection_stale:
+            await self.reconnect(self.vts)
+            self._hotkey_connection_stale = False
+        try:
             await self.vts.request(self.vts.vts_request.requestTriggerHotKey(motion_name))
+        except BaseException:
+            # pyvts的请求先发后收，超时取消或出错时请求可能已发出而回复未读，
+            # 迟到的回复会被同一连接上的下一个请求读到，因此下次使用前重建连接
+            self._hotkey_connection_stale = True
+            raise
     
+    def start_parameter_stream(self) -> asyncio.Task:
+        """
+        启动参数流循环，重复调用返回同一个任务。
+        之后参数连接上的回复由后台任务读取，不能再对 parameter_vts 调用 request。
+        """
+        if self._parameter_reply_task is None or self._parameter_reply_task.done():
+            self._parameter_reply_task = asyncio.create_task(self._drain_parameter_replies())
+        if self._parameter_task is None or self._parameter_task.done():
+            self._parameter_task = asyncio.create_task(self.parameter_stream.run())
+        return self._parameter_task
+
+    def add_parameter_producer(self, producer: ParameterProducer):
+        """加入额外的参数来源，同名参数以后加入的为准。"""
+        self.parameter_stream.add_producer(producer)
+
+    def play_mouth_envelope(self, envelope: Sequence[float], rate: float, start: Optional[float] = None):
+        """按振幅包络驱动口型，start 为对应音频开始播放的 perf_counter 时间。"""
+        self.mouth.play(envelope, rate, start)
+
+    async def _inject_parameters(self, values: Dict[str, float]):
+        # 只发送不等待回复，帧率不受VTS往返时间限制；回复由 _drain_parameter_replies 读取丢弃
+        request = self.parameter_vts.vts_request.requestSetMultiParameterValue(list(values), list(values.values()))
+        await self.parameter_vts.websocket.send(json.dumps(request))
+
+    async def _drain_parameter_replies(self):
+        """读取并丢弃参数连接上的回复，只打印错误回复，连接关闭时结束。"""
+        try:
+            async for message in self.parameter_vts.websocket:
+                reply = json.loads(message)
+                if reply.get("messageType") == "APIError":
+                    print(f"Error injecting parameters: {reply.get('data')}")
+        except Exception as e:
+            print(f"Parameter connection reader stopped: {e}")
+
     async def shutdown(self):
-        self._shutdown.set()
-        await self.task_queue.join()
+        self.parameter_stream.stop()
+        for task in (self._parameter_task, self._parameter_reply_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await self.shutdown_workers()
         await self.vts.close()
+        await self.parameter_vts.close()
 
-async def create_avatar_module() -> AvatarModule:
+async def create_avatar_module(**kwargs) -> AvatarModule:
     """
-    异步工厂函数，负责创建和初始化 AvatarModule 实例。
+    异步工厂函数，负责创建和初始化 AvatarModule 实例，kwargs 透传给 AvatarModule。
     """
-    module = AvatarModule()
+    module = AvatarModule(**kwargs)
     # 异步地执行内部的设置方法
     setup_task = asyncio.create_task(module._setup())
     # 等待设置完成
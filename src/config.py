@@ -0,0 +1,122 @@
+
+# =========================================================================
+# 配置加载与校验
+# -------------------------------------------------------------------------
+# 配置为JSON文件，按模块分段，未给出的字段使用 DEFAULT_CONFIG 中的默认值：
+# {
+#     "memory": {"milvus_host": "localhost", "milvus_port": "19530", "embedding_backend": "bge-m3", ...},
+#     "avatar": {"vts_host": "localhost", "vts_port": 8001, "token_path": "./pyvts_token.txt", "parameter_fps": 60, ...}
+# }
+# 本文件只依赖标准库，供健康检查等轻量入口使用。
+
+import copy
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CONFIG: Dict[str, Dict[str, Any]] = {
+    "memory": {
+        "enabled": True,
+        "milvus_host": "localhost",
+        "milvus_port": "19530",
+        "embedding_backend": "bge-m3",
+        "embedding_options": {},
+        "embedding_batch_size": 16,
+        "shards": 0, # 分片工作进程数量，0表示在主进程中运行记忆模块
+        "shard_health_interval": 10.0,
+        "cold_search_threshold": 0.5,
+        # 后台压缩：每隔 compaction_interval 秒把已总结的旧原始记忆向量移入冷存储，0表示不启动
+        "compaction_interval": 3600.0,
+        "compaction_min_age_seconds": 7 * 24 * 3600,
+        "compaction_keep_recent": 200,
+        "compaction_batch_size": 1000,
+    },
+    "avatar": {
+        "vts_host": "localhost",
+        "vts_port": 8001,
+        "token_path": "./pyvts_token.txt",
+        "parameter_fps": 60,
+        "motion_queue_size": 8,
+        "motion_timeout": 2.0,
+    },
+}
+
+# 配置文件路径的环境变量
+CONFIG_ENV = "DIGITALHUMAN_CONFIG"
+
+
+def load_config(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    加载配置，path 为空时读取环境变量 DIGITALHUMAN_CONFIG 指向的文件，都没有则使用默认配置。
+    文件顶层不是对象时抛出 ValueError；某一段不是对象时原样保留，由 validate_config 报告。
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    path = path or os.environ.get(CONFIG_ENV)
+    if not path:
+        return config
+    with open(path, "r", encoding="utf-8") as f:
+        user_config = json.load(f)
+    if not isinstance(user_config, dict):
+        raise ValueError(f"Config file {path} must contain a JSON object, got {type(user_config).__name__}.")
+    for section, values in user_config.items():
+        if isinstance(values, dict) and isinstance(config.get(section, {}), dict):
+            config.setdefault(section, {}).update(values)
+        else:
+            config[section] = values
+    return config
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_value_type(key: str, value: Any, default: Any) -> Optional[str]:
+    """
+    检查单个配置值的类型，返回错误描述，类型正确时返回None。
+    数值字段的int和float可以互换（bool除外），端口可以是整数或数字字符串。
+    """
+    if key.endswith("_port"):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            return "must be an int or a numeric str"
+        try:
+            port = int(value)
+        except ValueError:
+            return "must be an int or a numeric str"
+        return None if 0 < port < 65536 else "must be between 1 and 65535"
+    if _is_number(default):
+        return None if _is_number(value) else "must be a number"
+    if not isinstance(value, type(default)):
+        return f"must be {type(default).__name__}"
+    return None
+
+
+def validate_config(config: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    校验配置，返回错误信息列表，为空表示配置有效。不导入任何模型相关依赖。
+    """
+    from embedding_backends import EMBEDDING_BACKENDS
+
+    if not isinstance(config, dict):
+        return ["Config must be an object."]
+    errors = []
+    for section, defaults in DEFAULT_CONFIG.items():
+        values = config.get(section)
+        if not isinstance(values, dict):
+            errors.append(f"'{section}' must be an object.")
+            continue
+        for key in values:
+            if key not in defaults:
+                errors.append(f"Unknown key '{section}.{key}'.")
+        for key, default in defaults.items():
+            if key in values:
+                error = _check_value_type(key, values[key], default)
+                if error:
+                    errors.append(f"'{section}.{key}' {error}.")
+
+    memory = config.get("memory", {})
+    # 非字符串的后端名已在上面报告类型错误
+    backend = memory.get("embedding_backend") if isinstance(memory, dict) else None
+    if isinstance(backend, str) and backend not in EMBEDDING_BACKENDS:
+        errors.append(f"Unknown embedding backend '{backend}', "
+                      f"available: {sorted(EMBEDDING_BACKENDS)}.")
+    return errors
@@ -1,28 +1,129 @@
 import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from ABCs import AsyncModule
-from avatar import create_avatar_module, AvatarModule
-from milvus_database import create_memory_module, MemoryModule
+from config import load_config
+from output_parser import MotionStreamParser
+
+# 基础模型接口：输入prompt，流式返回文本片段
+LLMStream = Callable[[str], AsyncIterator[str]]
 
 class CoreModule():
-    def __init__(self):
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
         self._is_ready = asyncio.Event()
+        self.config = config if config is not None else load_config()
         self.all_modules = []
         self.avatar_module = None
         self.memory_module = None
         self.shutdown_event = asyncio.Event()
         self.ongoing_message = None
+        self._background_tasks: List[asyncio.Task] = []
 
     async def _setup(self):
         if not self._is_ready.is_set():
-            self.avatar_module = await create_avatar_module()
+            # 各模块及其依赖（pyvts、pymilvus、torch等）在此处才导入，保证 import core 足够轻量
+            from avatar import create_avatar_module
+
+            self.avatar_module = await create_avatar_module(**self.config["avatar"])
             self.all_modules.append(self.avatar_module)
-            self.memory_module = await create_memory_module()
-            self.all_modules.append(self.memory_module)
+            self._background_tasks.extend(self.avatar_module.start_workers())
+            self._background_tasks.append(self.avatar_module.start_parameter_stream())
+            memory_config = dict(self.config["memory"])
+            if memory_config.pop("enabled", True):
+                shards = memory_config.pop("shards", 0)
+                shard_health_interval = memory_config.pop("shard_health_interval", 10.0)
+                compaction_interval = memory_config.pop("compaction_interval", 3600.0)
+                compaction_policy = {key: memory_config.pop(f"compaction_{key}")
+                                     for key in ("min_age_seconds", "keep_recent", "batch_size")
+                                     if f"compaction_{key}" in memory_config}
+                if shards > 0:
+                    from memory_shards import create_sharded_memory_module
+                    self.memory_module = await create_sharded_memory_module(num_workers=shards, **memory_config)
+                    self.memory_module.start_health_checks(shard_health_interval)
+                else:
+                    from milvus_database import create_memory_module
+                    self.memory_module = await create_memory_module(**memory_config)
+                if compaction_interval > 0:
+                    self.memory_module.start_compaction_job(compaction_interval, **compaction_policy)
+                self.all_modules.append(self.memory_module)
             self._is_ready.set()
 
     async def shutdown(self):
         for module in self.all_modules:
             await module.shutdown()
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+
+    async def handle_turn(self, user_id: str, user_text: str, llm: LLMStream,
+                          on_speech: Optional[Callable[[str], Awaitable[None]]] = None,
+                          top_k: int = 3) -> Dict[str, Any]:
+        """
+        处理一轮对话：检索记忆 -> 组成prompt -> 流式生成 -> 动作指令交给avatar模块、纯文本交给on_speech -> 写回记忆。
+        Args:
+            user_id (str): 用户id。
+            user_text (str): 用户输入。
+            llm (LLMStream): 基础模型接口，输入prompt，流式返回文本片段。
+            on_speech (Optional[Callable[[str], Awaitable[None]]]): 纯文本片段的去向（TTS/UI）。
+            top_k (int): 检索的原始记忆数量。
+        Returns:
+            Dict[str, Any]: 回复文本、动作列表，以及各阶段相对本轮开始的耗时（秒）。
+        """
+        start = time.perf_counter()
+        timings: Dict[str, Optional[float]] = {"retrieval": None, "first_token": None, "first_motion_enqueued": None,
+                                               "first_speech": None, "generation": None, "full_turn": None}
+        elapsed = lambda: time.perf_counter() - start
+
+        # 1. 检索记忆，记忆模块是同步接口，放到线程中执行避免阻塞事件循环
+        client = None
+        memories: List[Dict[str, Any]] = []
+        if self.memory_module is not None:
+            client = self.memory_module.get_user_client(user_id)
+            if client is None:
+                client = await asyncio.to_thread(self.memory_module.start_user_client_instance, user_id)
+            memories = await asyncio.to_thread(client.query_raw_memory, user_text, top_k)
+        timings["retrieval"] = elapsed()
+
+        # 2. 组成prompt（输入模块完成前的简单拼接）
+        memory_text = "\n".join(m["text"] for m in memories)
+        prompt = f"{memory_text}\n{user_text}" if memory_text else user_text
+
+        # 3. 流式生成并分发
+        parser = MotionStreamParser()
+        reply_parts: List[str] = []
+        motions: List[str] = []
+
+        async def dispatch(events):
+            for kind, value in events:
+                if kind == "motion":
+                    motions.append(value)
+                    if self.avatar_module is not None:
+                        await self.avatar_module.enqueue_task(value)
+                    if timings["first_motion_enqueued"] is None:
+                        timings["first_motion_enqueued"] = elapsed()
+                else:
+                    reply_parts.append(value)
+                    if on_speech is not None:
+                        await on_speech(value)
+                    if timings["first_speech"] is None and value.strip():
+                        timings["first_speech"] = elapsed()
+
+        async for chunk in llm(prompt):
+            if timings["first_token"] is None:
+                timings["first_token"] = elapsed()
+            await dispatch(parser.feed(chunk))
+        await dispatch(parser.flush())
+        timings["generation"] = elapsed()
+
+        # 4. 写回记忆
+        reply = "".join(reply_parts).strip()
+        if client is not None:
+            await asyncio.to_thread(client.insert_record, {"role": "user", "text": user_text})
+            if reply:
+                await asyncio.to_thread(client.insert_record, {"role": "chatbot", "text": reply})
+        timings["full_turn"] = elapsed()
+        return {"reply": reply, "motions": motions, "timings": timings}
     
     async def main_loop(self):
         while not self.shutdown_event.is_set():
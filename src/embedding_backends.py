@@ -0,0 +1,170 @@
+
+# =========================================================================
+# 嵌入后端 (Embedding Backends)
+# -------------------------------------------------------------------------
+# MilvusEmbeddingFunction 通过 EmbeddingBackend 接口生成向量，可选后端：
+#   bge-m3        PyMilvus 的 BGEM3EmbeddingFunction（原有实现）
+#   bge-m3-int8   transformers 直接加载 BGE-M3，Linear 层动态量化为int8，仅CPU
+#   bge-m3-fp32   transformers 直接加载 BGE-M3，不量化，便于与int8版本对比
+#   fake          基于哈希的确定性假向量，不加载任何模型，用于测试
+# 所有后端都支持 max_tokens 截断；输入在 encode_bucketed 中按长度排序分批，减少padding浪费。
+# embedding_model_tag 由后端名称和影响向量的参数生成模型标识，记录在 raw_text_embeddings 集合描述中，
+# 用于发现服务或重建工具使用的模型与集合中向量的模型不一致。
+# torch/transformers 只在实例化对应后端时导入。
+
+import hashlib
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EmbeddingBackend(ABC):
+    """
+    嵌入后端的抽象基类。
+    子类需设置 self.dim，并实现 encode（输入一批文本，返回同顺序的归一化密集向量）。
+    """
+    dim: int
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """对一批文本生成密集向量，调用方保证批内文本长度相近。"""
+        pass
+
+    def text_length(self, text: str) -> int:
+        """
+        用于长度分桶的文本长度估计，默认使用字符数，避免为分桶额外跑一遍分词。
+        """
+        return len(text)
+
+
+def _set_torch_threads(num_threads: Optional[int]):
+    """设置torch的CPU线程数（进程级全局设置）。"""
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+class BGEM3Backend(EmbeddingBackend):
+    """
+    使用 PyMilvus 提供的 BGEM3EmbeddingFunction 进行向量嵌入。
+    """
+    def __init__(self, model_name: str = "BAAI/bge-m3", device: str = "cpu", use_fp16: bool = False,
+                 max_tokens: Optional[int] = None, num_threads: Optional[int] = None):
+        from pymilvus.model.hybrid import BGEM3EmbeddingFunction
+
+        _set_torch_threads(num_threads)
+        self.model = BGEM3EmbeddingFunction(model_name=model_name, device=device, use_fp16=use_fp16)
+        if max_tokens:
+            # BGEM3EmbeddingFunction 会把 _encode_config 原样传给 BGEM3FlagModel.encode
+            self.model._encode_config["max_length"] = max_tokens
+        self.dim = self.model.dim
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts)['dense_vecs'].tolist()
+
+
+class TransformersBackend(EmbeddingBackend):
+    """
+    直接用 transformers 加载 BGE-M3 计算密集向量（CLS池化 + L2归一化，与 BGE-M3 dense 输出一致）。
+    quantize=True 时对 Linear 层做动态int8量化，适合无GPU部署。
+    """
+    def __init__(self, model_name: str = "BAAI/bge-m3", quantize: bool = True, max_tokens: int = 512,
+                 num_threads: Optional[int] = None):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        _set_torch_threads(num_threads)
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.dim = model.config.hidden_size
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        torch = self._torch
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_tokens,
+                                return_tensors="pt")
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
+        embeddings = outputs.last_hidden_state[:, 0]
+        embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=-1)
+        return embeddings.tolist()
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """
+    基于哈希的确定性假向量，相同文本得到相同向量，不依赖任何模型，用于测试和基准。
+    batch_sizes 记录每次 encode 的批大小，便于检查分批行为。
+    """
+    def __init__(self, dim: int = 1024, max_tokens: Optional[int] = None, **kwargs):
+        self.dim = dim
+        self.max_tokens = max_tokens
+        self.batch_sizes: List[int] = []
+
+    def _embed_one(self, text: str) -> List[float]:
+        if self.max_tokens:
+            text = text[:self.max_tokens]
+        values: List[float] = []
+        counter = 0
+        while len(values) < self.dim:
+            digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend((b - 127.5) / 127.5 for b in digest)
+            counter += 1
+        values = values[:self.dim]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        self.batch_sizes.append(len(texts))
+        return [self._embed_one(t) for t in texts]
+
+
+EMBEDDING_BACKENDS: Dict[str, Callable[..., EmbeddingBackend]] = {
+    "bge-m3": BGEM3Backend,
+    "bge-m3-int8": lambda **kwargs: TransformersBackend(quantize=True, **kwargs),
+    "bge-m3-fp32": lambda **kwargs: TransformersBackend(quantize=False, **kwargs),
+    "fake": FakeEmbeddingBackend,
+}
+
+
+def create_embedding_backend(name: str = "bge-m3", **kwargs: Any) -> EmbeddingBackend:
+    """
+    按名称创建嵌入后端，kwargs 透传给后端构造函数（如 max_tokens、num_threads）。
+    """
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', available: {sorted(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[name](**kwargs)
+
+
+# 只影响速度、不影响向量结果的参数，不计入模型标识
+_RUNTIME_OPTIONS = {"num_threads", "device"}
+
+
+def embedding_model_tag(name: str = "bge-m3", options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    由后端名称和参数生成模型标识，例如 `bge-m3-int8(max_tokens=256)`，相同标识的后端生成的向量可以混用。
+    """
+    items = sorted((k, v) for k, v in (options or {}).items() if k not in _RUNTIME_OPTIONS)
+    if not items:
+        return name
+    return f"{name}({','.join(f'{k}={v}' for k, v in items)})"
+
+
+def encode_bucketed(backend: EmbeddingBackend, texts: List[str], batch_size: int = 16) -> List[List[float]]:
+    """
+    按长度排序后分批嵌入，使同一批内文本长度相近以减少padding，结果按输入顺序返回。
+    """
+    if not texts:
+        return []
+    order = sorted(range(len(texts)), key=lambda i: backend.text_length(texts[i]))
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        embeddings = backend.encode([texts[i] for i in batch_indices])
+        for i, embedding in zip(batch_indices, embeddings):
+            results[i] = embedding
+    return results
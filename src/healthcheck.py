@@ -0,0 +1,93 @@
+
+# =========================================================================
+# 轻量健康检查入口
+# -------------------------------------------------------------------------
+# 校验配置、检查依赖服务（Milvus、VTube Studio）是否可连接，全程不加载任何ML依赖。
+#   python healthcheck.py [--config path] [--import-budget 秒]
+# --import-budget 会在子进程中 import core，检查导入耗时不超过预算，且没有提前导入重型依赖。
+# 输出JSON报告，全部通过时退出码为0，否则为1。
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from config import load_config, validate_config
+
+# import core 时不应该被导入的重型依赖
+HEAVY_MODULES = ["torch", "transformers", "pymilvus", "pyvts", "numpy"]
+
+
+def check_port(host: str, port: int, timeout: float = 1.0) -> Dict[str, Any]:
+    """检查TCP端口是否可连接。"""
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+    except OSError as e:
+        return {"ok": False, "error": str(e)}
+
+
+def check_import_budget(module: str = "core", budget: float = 1.0) -> Dict[str, Any]:
+    """
+    在干净的子进程中导入模块，检查导入耗时和是否导入了重型依赖。
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return {"ok": False, "error": proc.stderr.strip().splitlines()[-1:]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "ok": result["elapsed"] <= budget and not result["heavy"],
+        "elapsed_s": round(result["elapsed"], 4),
+        "budget_s": budget,
+        "heavy_modules_loaded": result["heavy"],
+    }
+
+
+def run_checks(config_path: Optional[str] = None, import_budget: Optional[float] = None,
+               timeout: float = 1.0) -> Dict[str, Any]:
+    """执行全部检查，返回报告。"""
+    report: Dict[str, Any] = {}
+    try:
+        config = load_config(config_path)
+    except (OSError, ValueError) as e:
+        return {"ok": False, "config": {"ok": False, "errors": [str(e)]}}
+
+    errors: List[str] = validate_config(config)
+    report["config"] = {"ok": not errors, "errors": errors}
+    if not errors:
+        memory, avatar = config["memory"], config["avatar"]
+        report["milvus"] = check_port(memory["milvus_host"], memory["milvus_port"], timeout)
+        report["vts"] = check_port(avatar["vts_host"], avatar["vts_port"], timeout)
+    if import_budget is not None:
+        report["import_core"] = check_import_budget("core", import_budget)
+    # 健康检查自身也不应加载重型依赖
+    report["heavy_modules_loaded"] = [m for m in HEAVY_MODULES if m in sys.modules]
+    report["ok"] = all(v["ok"] for v in report.values() if isinstance(v, dict)) \
+        and not report["heavy_modules_loaded"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查配置和依赖服务是否就绪，不加载ML依赖。")
+    parser.add_argument("--config", default=None, help="JSON配置文件路径")
+    parser.add_argument("--import-budget", type=float, default=None, help="import core 的耗时预算（秒）")
+    parser.add_argument("--timeout", type=float, default=1.0, help="端口连接超时（秒）")
+    args = parser.parse_args()
+
+    report = run_checks(args.config, args.import_budget, args.timeout)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["ok"] else 1)
@@ -0,0 +1,205 @@
+
+# =========================================================================
+# 原始记忆向量冷存储 (Cold Archive)
+# -------------------------------------------------------------------------
+# raw_text_embeddings 集合全部加载在内存中，每条消息一个1024维float32向量。
+# 已被总结（落在某个摘要的 start_id/end_id 区间内）、且足够旧的向量由后台压缩任务从Milvus移到磁盘上的冷存储：
+#   <prefix>.ids.i64   向量对应的SQL id，int64小端，按归档顺序追加（不要求递增）
+#   <prefix>.f16       L2归一化后的向量，float16小端，按行连续存放
+# 冷存储以内存映射方式只读打开，仅在热集合和摘要的检索结果都较弱时才做暴力检索。
+# SQL中的原始记录不受影响，冷存储命中的记录照常从SQL取回原文。
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class ColdArchive:
+    """
+    追加写、内存映射读的float16向量存储。
+    """
+    def __init__(self, path_prefix: str, dim: int):
+        self.path_prefix = path_prefix
+        self.ids_path = f"{path_prefix}.ids.i64"
+        self.vectors_path = f"{path_prefix}.f16"
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._ids: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._sorted_ids: Optional[np.ndarray] = None # 已归档id的有序副本，用于判断是否已归档
+
+    def __len__(self) -> int:
+        if not os.path.exists(self.ids_path):
+            return 0
+        return os.path.getsize(self.ids_path) // 8
+
+    @property
+    def nbytes(self) -> int:
+        """冷存储占用的磁盘字节数。"""
+        return sum(os.path.getsize(p) for p in (self.ids_path, self.vectors_path) if os.path.exists(p))
+
+    def contains(self, ids: List[int]) -> np.ndarray:
+        """逐个判断id是否已归档，返回bool数组。"""
+        archived, _ = self._load()
+        with self._lock:
+            if self._sorted_ids is None:
+                self._sorted_ids = np.sort(np.asarray(archived))
+            sorted_ids = self._sorted_ids
+        query = np.asarray(ids, dtype="<i8")
+        if not len(sorted_ids):
+            return np.zeros(len(query), dtype=bool)
+        positions = np.minimum(np.searchsorted(sorted_ids, query), len(sorted_ids) - 1)
+        return sorted_ids[positions] == query
+
+    def iter_batches(self, batch_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """按归档顺序分批读出 (ids, float16向量) 副本，用于导出。"""
+        ids, vectors = self._load()
+        for start in range(0, len(ids), batch_size):
+            yield np.array(ids[start:start + batch_size]), np.array(vectors[start:start + batch_size])
+
+    def _load(self):
+        """以内存映射方式打开文件，追加后重新打开。"""
+        with self._lock:
+            if self._ids is None:
+                count = len(self)
+                if count == 0:
+                    self._ids = np.empty(0, dtype="<i8")
+                    self._vectors = np.empty((0, self.dim), dtype="<f2")
+                else:
+                    self._ids = np.memmap(self.ids_path, dtype="<i8", mode="r", shape=(count,))
+                    self._vectors = np.memmap(self.vectors_path, dtype="<f2", mode="r", shape=(count, self.dim))
+            return self._ids, self._vectors
+
+    def append(self, ids: List[int], vectors: List[List[float]]):
+        """
+        追加一批向量，id不要求递增，调用方负责不重复归档同一id。写入后fsync，保证从Milvus删除前数据已落盘。
+        """
+        if not ids:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock:
+            # 先写向量再写id，中途失败时 len(self) 只会少算，不会读到不完整的行；
+            # 追加前截掉上次失败残留的向量，保证向量行与id一一对应
+            self._ids, self._vectors, self._sorted_ids = None, None, None
+            expected_size = len(self) * self.dim * 2
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != expected_size:
+                os.truncate(self.vectors_path, expected_size)
+            with open(self.vectors_path, "ab") as f:
+                matrix.astype("<f2").tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.ids_path, "ab") as f:
+                np.asarray(ids, dtype="<i8").tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def retire(self, suffix: str, replacement: Optional["ColdArchive"] = None):
+        """
+        将冷存储文件改名为 <原文件名>.<suffix> 留作备份，用于更换嵌入模型后旧向量失效。
+        replacement 不为空时将其文件移入本冷存储的位置（例如用新模型重新嵌入的归档），否则之后冷存储为空。
+        """
+        with self._lock:
+            self._ids, self._vectors, self._sorted_ids = None, None, None
+            # 先移走id文件，中途失败时冷存储只会显得为空，不会把新向量和旧id对应起来
+            for path in (self.ids_path, self.vectors_path):
+                if os.path.exists(path):
+                    os.replace(path, f"{path}.{suffix}")
+            if replacement is not None:
+                with replacement._lock:
+                    replacement._ids, replacement._vectors, replacement._sorted_ids = None, None, None
+                    for source, path in ((replacement.vectors_path, self.vectors_path),
+                                         (replacement.ids_path, self.ids_path)):
+                        if os.path.exists(source):
+                            os.replace(source, path)
+
+    def search(self, query_embedding: List[float], top_k: int = 3, chunk_size: int = 65536) -> List[Dict[str, Any]]:
+        """
+        分块暴力检索，返回COSINE相似度最高的 top_k 条，格式与热集合命中一致：`id`, `distance`。
+        """
+        ids, vectors = self._load()
+        if not len(ids):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1.0)
+
+        best_ids, best_scores = [], []
+        for start in range(0, len(ids), chunk_size):
+            scores = vectors[start:start + chunk_size].astype(np.float32) @ query
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            best_ids.extend(ids[start + top].tolist())
+            best_scores.extend(scores[top].tolist())
+
+        order = np.argsort(best_scores)[::-1][:top_k]
+        return [{"id": int(best_ids[i]), "distance": float(best_scores[i])} for i in order]
+
+
+def compact_raw_vectors(client, archive: ColdArchive, min_age_seconds: int = 7 * 24 * 3600,
+                        keep_recent: int = 200, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    将已总结且足够旧的原始记忆向量从Milvus热集合移入冷存储。
+    保留条件（满足任一即留在热集合）：id不在任何摘要的 [start_id, end_id] 区间内、时间晚于 now - min_age_seconds、
+    属于最新 keep_recent 条。是否已总结按摘要记录的id区间判断而不是时间：导入的历史记录时间早，但可能从未被总结。
+    每轮按条件扫描全部候选记录并跳过已归档的id，而不是从上次归档的最大id继续。
+    Args:
+        client (UserClient): 已创建数据库的用户客户端。
+        archive (ColdArchive): 该用户的冷存储。
+        min_age_seconds (int): 向量移入冷存储前的最短保留时间。
+        keep_recent (int): 始终保留在热集合中的最新记录条数。
+        batch_size (int): 每批移动的向量数量。
+    Returns:
+        Dict[str, Any]: 统计信息，包含移动数量和回收的内存字节数。
+    """
+    start = time.perf_counter()
+    stats = {"user_id": client.user_id, "moved": 0, "missing": 0, "hot_bytes_reclaimed": 0,
+             "archive_bytes_added": 0, "archive_vectors": len(archive), "elapsed_s": 0.0}
+    collection = client.raw_text_collection
+    if collection is None:
+        return stats
+
+    cutoff_time = int(time.time()) - min_age_seconds
+
+    storage = client._connect_sql()
+    newest = storage.read_one("SELECT MAX(id) AS max_id FROM user_dialogues;")
+    max_keep_id = (newest["max_id"] or 0) - keep_recent
+    archive_bytes_before = archive.nbytes
+
+    query = ("SELECT d.id FROM user_dialogues d WHERE d.id <= ? AND d.time <= ? AND EXISTS "
+             "(SELECT 1 FROM summary s WHERE d.id BETWEEN s.start_id AND s.end_id) ORDER BY d.id ASC;")
+    batch: List[int] = []
+
+    def move(batch_ids: List[int]):
+        batch_ids = [i for i, archived in zip(batch_ids, archive.contains(batch_ids)) if not archived]
+        if not batch_ids:
+            return
+        rows = collection.query(expr=f"id in {batch_ids}", output_fields=["id", "embedding"])
+        vectors = {row["id"]: row["embedding"] for row in rows}
+        present = [i for i in batch_ids if i in vectors]
+        # 先落盘再删除，中途失败最多导致重复，不会丢失向量
+        archive.append(present, [vectors[i] for i in present])
+        if present:
+            collection.delete(expr=f"id in {present}")
+        stats["moved"] += len(present)
+        stats["missing"] += len(batch_ids) - len(present)
+
+    for row in storage.iter_read(query, (max_keep_id, cutoff_time)):
+        batch.append(row["id"])
+        if len(batch) >= batch_size:
+            move(batch)
+            batch = []
+    if batch:
+        move(batch)
+
+    if stats["moved"]:
+        collection.flush()
+        collection.compact()
+    stats["hot_bytes_reclaimed"] = stats["moved"] * (archive.dim * 4 + 8)
+    stats["archive_bytes_added"] = archive.nbytes - archive_bytes_before
+    stats["archive_vectors"] = len(archive)
+    stats["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return stats
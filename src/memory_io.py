@@ -0,0 +1,250 @@
+
+# =========================================================================
+# 记忆批量导入/导出
+# -------------------------------------------------------------------------
+# 1. JSONL对话日志导入（也用于角色模板初始化）
+#    每行一条记录: {"role": "user", "text": "你好", "time": 1700000000}，time可选
+#    通过 UserClient.bulk_insert_records 单事务写SQL，批量嵌入，批量写Milvus
+#
+# 2. 紧凑导出格式（目录），可不重新嵌入直接导回
+#    manifest.json              版本、用户id、向量维度、各部分数量
+#    dialogues.jsonl            user_dialogues 表的原始行（含id）
+#    summary.jsonl              summary 表的原始行（含id和覆盖的记录id区间 start_id/end_id）
+#    raw_text_ids.i64           raw_text_embeddings 中向量对应的id，int64小端
+#    raw_text_embeddings.f16    与上面id一一对应的向量，float16小端，按行连续存放
+#    summary_ids.i64            summary_collection 中向量对应的id
+#    summary_embeddings.f16     与上面id一一对应的向量
+#    raw_archive_ids.i64        冷存储中已移出热集合的原始文本向量id（可选，无冷存储时为空）
+#    raw_archive_embeddings.f16 与上面id一一对应的冷存储向量，导入时写回冷存储而不是Milvus
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+EXPORT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+DIALOGUES_FILE = "dialogues.jsonl"
+SUMMARY_FILE = "summary.jsonl"
+RAW_IDS_FILE = "raw_text_ids.i64"
+RAW_VECTORS_FILE = "raw_text_embeddings.f16"
+SUMMARY_IDS_FILE = "summary_ids.i64"
+SUMMARY_VECTORS_FILE = "summary_embeddings.f16"
+ARCHIVE_IDS_FILE = "raw_archive_ids.i64"
+ARCHIVE_VECTORS_FILE = "raw_archive_embeddings.f16"
+
+
+def iter_jsonl_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取JSONL文件，跳过空行和无法解析的行。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Warning: skip invalid JSON at {path}:{line_no}: {e}")
+
+
+def import_jsonl(client, path: str, embed_batch_size: int = 64) -> List[int]:
+    """
+    从JSONL对话日志批量导入记录。
+    Args:
+        client (UserClient): 已创建数据库的用户客户端。
+        path (str): JSONL文件路径。
+        embed_batch_size (int): 每批嵌入的窗口数量。
+    Returns:
+        List[int]: 插入记录的ID列表。
+    """
+    return client.bulk_insert_records(iter_jsonl_records(path), embed_batch_size=embed_batch_size)
+
+
+def _fetch_vectors(collection, ids: List[int]) -> Dict[int, List[float]]:
+    """按id从Milvus集合中取回向量。"""
+    if not ids:
+        return {}
+    rows = collection.query(expr=f"id in {ids}", output_fields=["id", "embedding"])
+    return {row["id"]: row["embedding"] for row in rows}
+
+
+def _export_table(storage, table: str, columns: str, out_path: str, ids_path: str, vectors_path: str,
+                  collection, batch_size: int) -> int:
+    """
+    流式导出一张SQL表及其在Milvus中对应的向量。
+    Returns:
+        int: 导出的向量数量。
+    """
+    vector_count = 0
+    with open(out_path, "w", encoding="utf-8") as rows_f, \
+            open(ids_path, "wb") as ids_f, open(vectors_path, "wb") as vec_f:
+        rows = []
+        for row in storage.iter_read(f"SELECT {columns} FROM {table} ORDER BY id ASC;", batch_size=batch_size):
+            rows_f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            rows.append(row)
+            if len(rows) < batch_size:
+                continue
+            vector_count += _export_vectors(collection, rows, ids_f, vec_f)
+            rows = []
+        vector_count += _export_vectors(collection, rows, ids_f, vec_f)
+    return vector_count
+
+
+def _export_vectors(collection, rows: List[Dict[str, Any]], ids_f, vec_f) -> int:
+    """导出一批SQL行在Milvus中对应的向量，返回写出的向量数量。"""
+    if collection is None or not rows:
+        return 0
+    vectors = _fetch_vectors(collection, [row["id"] for row in rows])
+    # 向量缺失的id不写入，导入后可由重建工具补齐
+    present_ids = [row["id"] for row in rows if row["id"] in vectors]
+    if present_ids:
+        np.asarray(present_ids, dtype="<i8").tofile(ids_f)
+        np.asarray([vectors[i] for i in present_ids], dtype="<f2").tofile(vec_f)
+    return len(present_ids)
+
+
+def export_user_memory(client, out_dir: str, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    将用户的SQL记录和向量（包括冷存储中的向量）导出为紧凑格式。
+    Args:
+        client (UserClient): 已创建数据库的用户客户端。
+        out_dir (str): 导出目录，不存在时自动创建。
+        batch_size (int): 每批从SQL和Milvus读取的记录数量。
+    Returns:
+        Dict[str, Any]: 写入 manifest.json 的内容。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    storage = client._connect_sql()
+
+    raw_count = _export_table(storage, "user_dialogues", "id, time, role, text",
+                              os.path.join(out_dir, DIALOGUES_FILE),
+                              os.path.join(out_dir, RAW_IDS_FILE),
+                              os.path.join(out_dir, RAW_VECTORS_FILE),
+                              client.raw_text_collection, batch_size)
+    summary_count = _export_table(storage, "summary", "id, start_time, end_time, summary_text, start_id, end_id",
+                                  os.path.join(out_dir, SUMMARY_FILE),
+                                  os.path.join(out_dir, SUMMARY_IDS_FILE),
+                                  os.path.join(out_dir, SUMMARY_VECTORS_FILE),
+                                  client.summary_collection, batch_size)
+
+    # 已压缩用户的旧向量只在冷存储中，原样导出
+    archive_count = 0
+    with open(os.path.join(out_dir, ARCHIVE_IDS_FILE), "wb") as ids_f, \
+            open(os.path.join(out_dir, ARCHIVE_VECTORS_FILE), "wb") as vec_f:
+        if client.cold_archive is not None:
+            for ids, vectors in client.cold_archive.iter_batches(batch_size):
+                ids.astype("<i8").tofile(ids_f)
+                vectors.astype("<f2").tofile(vec_f)
+                archive_count += len(ids)
+
+    manifest = {
+        "version": EXPORT_FORMAT_VERSION,
+        "user_id": client.user_id,
+        "dim": client.embedding_function.dim,
+        "raw_vector_count": raw_count,
+        "summary_vector_count": summary_count,
+        "archive_vector_count": archive_count,
+        "created": int(time.time()),
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Exported user {client.user_id}: {raw_count} raw vectors, {archive_count} archived vectors, "
+          f"{summary_count} summary vectors to {out_dir}.")
+    return manifest
+
+
+def _load_vectors(ids_path: str, vectors_path: str, dim: int):
+    """以内存映射方式读取导出的id和float16向量文件。"""
+    if not os.path.exists(ids_path) or os.path.getsize(ids_path) == 0:
+        return np.empty(0, dtype="<i8"), np.empty((0, dim), dtype="<f2")
+    ids = np.memmap(ids_path, dtype="<i8", mode="r")
+    vectors = np.memmap(vectors_path, dtype="<f2", mode="r", shape=(len(ids), dim))
+    return ids, vectors
+
+
+def import_user_memory(client, in_dir: str, batch_size: int = 1000) -> Optional[Dict[str, Any]]:
+    """
+    从紧凑导出格式导入用户记忆，向量直接写入Milvus，不重新嵌入。
+    导入保留原有id，目标用户库应为空。
+    Args:
+        client (UserClient): 已创建数据库的用户客户端。
+        in_dir (str): 导出目录。
+        batch_size (int): 每批写入Milvus的向量数量。
+    Returns:
+        Optional[Dict[str, Any]]: 导入目录的 manifest，失败时为 None。
+    """
+    with open(os.path.join(in_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != EXPORT_FORMAT_VERSION:
+        print(f"Error: unsupported export format version {manifest.get('version')}.")
+        return None
+    dim = manifest["dim"]
+    if dim != client.embedding_function.dim:
+        print(f"Error: export dim {dim} does not match embedding dim {client.embedding_function.dim}.")
+        return None
+
+    # 1. 在写线程中单事务写入SQL，保留原id
+    summaries: Dict[int, Dict[str, Any]] = {}
+
+    def insert_rows(conn):
+        conn.executemany("INSERT INTO user_dialogues (id, time, role, text) VALUES (:id, :time, :role, :text);",
+                         iter_jsonl_records(os.path.join(in_dir, DIALOGUES_FILE)))
+        for row in iter_jsonl_records(os.path.join(in_dir, SUMMARY_FILE)):
+            # 旧导出文件没有摘要的id区间，插入后由 _backfill_summary_id_ranges 按时间范围回填
+            conn.execute("INSERT INTO summary (id, start_time, end_time, summary_text, start_id, end_id) "
+                         "VALUES (:id, :start_time, :end_time, :summary_text, :start_id, :end_id);",
+                         {"start_id": None, "end_id": None, **row})
+            summaries[row["id"]] = row
+        client._backfill_summary_id_ranges(conn)
+
+    try:
+        client._connect_sql().run_in_writer(insert_rows).result()
+    except Exception as e:
+        print(f"Error importing SQL rows from {in_dir}: {e}")
+        return None
+
+    # 2. 原始文本向量批量写入，最后统一flush
+    ids, vectors = _load_vectors(os.path.join(in_dir, RAW_IDS_FILE), os.path.join(in_dir, RAW_VECTORS_FILE), dim)
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size].tolist()
+        batch_vectors = vectors[start:start + batch_size].astype(np.float32).tolist()
+        client._insert_to_milvus_raw_text_batch(batch_ids, batch_vectors, flush=False)
+    if len(ids) and client.raw_text_collection:
+        client.raw_text_collection.flush()
+
+    # 3. 冷存储向量写回冷存储，没有这两个文件的旧导出视为无冷存储
+    ids, vectors = _load_vectors(os.path.join(in_dir, ARCHIVE_IDS_FILE),
+                                 os.path.join(in_dir, ARCHIVE_VECTORS_FILE), dim)
+    if len(ids):
+        if client.cold_archive is None:
+            print(f"Error: user {client.user_id} has no cold archive, {len(ids)} archived vectors not imported.")
+        else:
+            for start in range(0, len(ids), batch_size):
+                client.cold_archive.append(ids[start:start + batch_size].tolist(),
+                                           vectors[start:start + batch_size].astype(np.float32))
+
+    # 4. 摘要向量连同元数据批量写入
+    ids, vectors = _load_vectors(os.path.join(in_dir, SUMMARY_IDS_FILE), os.path.join(in_dir, SUMMARY_VECTORS_FILE), dim)
+    if len(ids) and client.summary_collection:
+        try:
+            for start in range(0, len(ids), batch_size):
+                batch_ids = ids[start:start + batch_size].tolist()
+                batch_rows = [summaries[i] for i in batch_ids]
+                client.summary_collection.insert([
+                    batch_ids,
+                    vectors[start:start + batch_size].astype(np.float32).tolist(),
+                    [r["start_time"] for r in batch_rows],
+                    [r["end_time"] for r in batch_rows],
+                    [r["summary_text"] for r in batch_rows],
+                ])
+            client.summary_collection.flush()
+        except Exception as e:
+            print(f"Error importing summary vectors from {in_dir}: {e}")
+
+    print(f"Imported user {manifest.get('user_id')} from {in_dir} into user {client.user_id}.")
+    return manifest
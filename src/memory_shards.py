@@ -0,0 +1,450 @@
+
+# =========================================================================
+# 多进程分片记忆模块 (ShardedMemoryModule)
+# -------------------------------------------------------------------------
+# 所有 UserClient 都在一个进程里时，嵌入、rerank 和 SQLite 操作都被GIL串行化。
+# 分片模式下用户按一致性哈希分配到 N 个工作进程，每个工作进程拥有自己的 MemoryModule（模型和用户客户端），
+# 主进程通过管道与工作进程通信，对外接口与 MemoryModule 一致：
+#   start_user_client_instance / get_user_client / close_user_client_instance / start_compaction_job / shutdown
+# 返回的 RemoteUserClient 代理 UserClient 的公开方法。
+# 同一工作进程的请求串行执行，不同工作进程并行，调用方应从多个线程（如 asyncio.to_thread）发起请求。
+# 健康检查定期ping各工作进程，无响应或已退出的进程会被重启，并重新打开原先分配给它的用户；
+# 重新打开失败的用户在之后每轮健康检查和该用户的下一次调用时重试。
+# 配置 memory.shards 大于0时 CoreModule 使用分片模式，memory.shard_health_interval 为健康检查间隔（秒）。
+#
+# 吞吐基准（需要Milvus服务）：python memory_shards.py [--backend fake] [--max-workers N] [--milvus-host H]
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ABCs import InstantModule
+
+# RemoteUserClient 可代理的 UserClient 方法
+PROXIED_METHODS = {
+    "insert_record", "bulk_insert_records", "summarize_memory",
+    "query_raw_memory", "query_summary_memory", "compact_raw_vectors",
+}
+
+# _call_user 使用模块的 request_timeout
+_DEFAULT_TIMEOUT = object()
+
+
+class HashRing:
+    """
+    一致性哈希环，每个分片在环上有 replicas 个虚拟节点。
+    """
+    def __init__(self, shard_count: int, replicas: int = 64):
+        self.shard_count = shard_count
+        points = []
+        for shard, replica in itertools.product(range(shard_count), range(replicas)):
+            points.append((self._hash(f"shard-{shard}:{replica}"), shard))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def get_shard(self, key: str) -> int:
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._shards[index]
+
+
+# =========================================================================
+# 工作进程
+# -------------------------------------------------------------------------
+def _worker_main(conn, module_kwargs: Dict[str, Any]):
+    """
+    工作进程入口。请求格式 (op, user_id, args, kwargs)，回复格式 ("ok", 结果) 或 ("error", 错误信息)。
+    MemoryModule（及pymilvus）在第一次用户操作时才创建，ping 不依赖 Milvus。
+    """
+    module = None
+    loop = asyncio.new_event_loop()
+
+    def get_module():
+        nonlocal module
+        if module is None:
+            from milvus_database import MemoryModule
+            module = MemoryModule(**module_kwargs)
+            loop.run_until_complete(module._setup())
+        return module
+
+    while True:
+        try:
+            op, user_id, args, kwargs = conn.recv()
+        except EOFError:
+            break
+        try:
+            if op == "ping":
+                result = os.getpid()
+            elif op == "start_user":
+                get_module().start_user_client_instance(user_id, *args, **kwargs)
+                result = True
+            elif op == "close_user":
+                get_module().close_user_client_instance(user_id)
+                result = True
+            elif op == "call":
+                client = get_module().get_user_client(user_id)
+                if client is None:
+                    raise KeyError(f"UserClient for {user_id} not found.")
+                method, *method_args = args
+                if method not in PROXIED_METHODS:
+                    raise AttributeError(f"UserClient method '{method}' is not proxied.")
+                result = getattr(client, method)(*method_args, **kwargs)
+            elif op == "shutdown":
+                if module is not None:
+                    loop.run_until_complete(module.shutdown())
+                conn.send(("ok", True))
+                break
+            else:
+                raise ValueError(f"Unknown op '{op}'.")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    loop.close()
+    conn.close()
+
+
+class _Worker:
+    """主进程中一个工作进程的句柄。"""
+    def __init__(self, index: int, ctx, module_kwargs: Dict[str, Any]):
+        self.index = index
+        self.lock = threading.Lock()
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, module_kwargs),
+                                   name=f"memory-shard-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.restarts = 0
+        self.requests = 0
+        self.broken = False # 请求超时后管道中可能残留过期回复，该进程必须重启后才能继续使用
+
+    def request(self, op: str, user_id: Optional[str] = None, args: Tuple = (),
+                kwargs: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        with self.lock:
+            if self.broken:
+                raise RuntimeError(f"Memory shard {self.index} is waiting for restart.")
+            self.conn.send((op, user_id, args, kwargs or {}))
+            if not self.conn.poll(timeout):
+                self.broken = True
+                raise TimeoutError(f"Memory shard {self.index} did not respond to '{op}' in {timeout}s.")
+            status, result = self.conn.recv()
+            self.requests += 1
+        if status == "error":
+            raise RuntimeError(f"Memory shard {self.index}: {result}")
+        return result
+
+    def stop(self, timeout: float = 10.0):
+        try:
+            if self.process.is_alive():
+                self.request("shutdown", timeout=timeout)
+        except Exception as e:
+            print(f"Error shutting down memory shard {self.index}: {e}")
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class RemoteUserClient:
+    """
+    工作进程中 UserClient 的代理，方法签名与 UserClient 一致，参数和返回值需可pickle。
+    """
+    def __init__(self, module: "ShardedMemoryModule", user_id: str):
+        self._module = module
+        self.user_id = user_id
+
+    def __getattr__(self, name: str):
+        if name not in PROXIED_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            if name == "bulk_insert_records":
+                args = (list(args[0]),) + args[1:] # 迭代器不能跨进程传递
+            return self._module._call_user(self.user_id, name, *args, **kwargs)
+        return call
+
+    def close(self):
+        self._module.close_user_client_instance(self.user_id)
+
+
+class ShardedMemoryModule(InstantModule):
+    """
+    多进程分片的记忆模块，对外接口与 MemoryModule 一致。
+    """
+    def __init__(self, num_workers: Optional[int] = None, request_timeout: Optional[float] = 120.0,
+                 health_check_timeout: float = 5.0, **module_kwargs):
+        """
+        Args:
+            num_workers (Optional[int]): 工作进程数量，默认为CPU核数。
+            request_timeout (Optional[float]): 单次请求超时秒数，None表示不超时。
+            health_check_timeout (float): 健康检查ping的超时秒数。
+            module_kwargs: 透传给每个工作进程中 MemoryModule 的参数。
+        """
+        super().__init__()
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.request_timeout = request_timeout
+        self.health_check_timeout = health_check_timeout
+        self.module_kwargs = module_kwargs
+        self.ring = HashRing(self.num_workers)
+        self.workers: List[_Worker] = []
+        self.user_clients: Dict[str, RemoteUserClient] = {}
+        self._user_roles: Dict[str, Optional[str]] = {}
+        self._unopened_users: Dict[str, str] = {} # 工作进程重启后未能重新打开的用户及错误信息
+        self._ctx = multiprocessing.get_context("spawn") # 子进程不继承已加载的模型和线程
+        self._health_task: Optional[asyncio.Task] = None
+        self._compaction_task: Optional[asyncio.Task] = None
+        self.compaction_stats: List[Dict[str, Any]] = [] # 最近一轮压缩各用户的统计信息
+
+    async def _setup(self):
+        if not self._is_ready.is_set():
+            self.workers = [_Worker(i, self._ctx, self.module_kwargs) for i in range(self.num_workers)]
+            await asyncio.gather(*(asyncio.to_thread(w.request, "ping", timeout=self.request_timeout)
+                                   for w in self.workers))
+            self._is_ready.set()
+
+    def _worker_for(self, user_id: str) -> _Worker:
+        return self.workers[self.ring.get_shard(user_id)]
+
+    def _call_user(self, user_id: str, method: str, *args, _timeout: Any = _DEFAULT_TIMEOUT, **kwargs) -> Any:
+        worker = self._worker_for(user_id)
+        if user_id in self._unopened_users and not self._reopen_user(worker, user_id):
+            raise RuntimeError(f"UserClient for {user_id} could not be reopened after a shard restart: "
+                               f"{self._unopened_users.get(user_id)}")
+        timeout = self.request_timeout if _timeout is _DEFAULT_TIMEOUT else _timeout
+        return worker.request("call", user_id, (method,) + args, kwargs, timeout=timeout)
+
+    def _reopen_user(self, worker: _Worker, user_id: str) -> bool:
+        """在重启后的工作进程中重新打开用户，失败时记录错误留待重试。"""
+        try:
+            worker.request("start_user", user_id, kwargs={"initial_role": self._user_roles.get(user_id)},
+                           timeout=self.request_timeout)
+        except Exception as e:
+            self._unopened_users[user_id] = str(e)
+            print(f"Error reopening user {user_id} on memory shard {worker.index}: {e}")
+            return False
+        self._unopened_users.pop(user_id, None)
+        return True
+
+    def start_user_client_instance(self, user_id: str, initial_role: Optional[str] = None) -> RemoteUserClient:
+        """
+        在用户所属的工作进程中启动用户接口实例。
+        """
+        if user_id in self.user_clients:
+            return self.user_clients[user_id]
+        self._worker_for(user_id).request("start_user", user_id, kwargs={"initial_role": initial_role},
+                                          timeout=self.request_timeout)
+        client = RemoteUserClient(self, user_id)
+        self.user_clients[user_id] = client
+        self._user_roles[user_id] = initial_role
+        return client
+
+    def close_user_client_instance(self, user_id: str):
+        """
+        关闭一个用户接口实例，删除用户信息。
+        """
+        if user_id not in self.user_clients:
+            print(f"UserClient for {user_id} not found.")
+            return
+        self._worker_for(user_id).request("close_user", user_id, timeout=self.request_timeout)
+        del self.user_clients[user_id]
+        del self._user_roles[user_id]
+        self._unopened_users.pop(user_id, None)
+
+    def get_user_client(self, user_id: str) -> Optional[RemoteUserClient]:
+        """获取指定user_id的用户客户端代理。"""
+        return self.user_clients.get(user_id)
+
+    # ---------------------------------------------------------------------
+    # 健康检查与重启
+    # ---------------------------------------------------------------------
+    def check_health(self) -> List[Dict[str, Any]]:
+        """
+        ping所有工作进程，重启已退出或无响应的进程，并重新打开分配给它的用户。
+        上一轮未能重新打开的用户在健康的工作进程上重试，失败的用户记录在 `unopened_users` 中，不影响其他分片的检查。
+        Returns:
+            List[Dict[str, Any]]: 各工作进程的状态。
+        """
+        report = []
+        for i, worker in enumerate(self.workers):
+            status = {"shard": i, "pid": worker.process.pid, "restarted": False}
+            try:
+                if not worker.process.is_alive():
+                    raise RuntimeError(f"exited with code {worker.process.exitcode}")
+                if worker.broken:
+                    raise RuntimeError("timed out on an earlier request")
+                start = time.perf_counter()
+                worker.request("ping", timeout=self.health_check_timeout)
+                status["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            except Exception as e:
+                print(f"Memory shard {i} unhealthy ({e}), restarting.")
+                status["error"] = str(e)
+                status["restarted"] = True
+                try:
+                    self._restart_worker(i)
+                except Exception as restart_error:
+                    print(f"Error restarting memory shard {i}: {restart_error}")
+                    status["restart_error"] = str(restart_error)
+                status["pid"] = self.workers[i].process.pid
+            else:
+                for user_id in [u for u in self._unopened_users if self.ring.get_shard(u) == i]:
+                    self._reopen_user(worker, user_id)
+            unopened = {u: err for u, err in self._unopened_users.items() if self.ring.get_shard(u) == i}
+            if unopened:
+                status["unopened_users"] = unopened
+            status["requests"] = self.workers[i].requests
+            status["restarts"] = self.workers[i].restarts
+            report.append(status)
+        return report
+
+    def _restart_worker(self, index: int):
+        old = self.workers[index]
+        if old.process.is_alive():
+            old.process.terminate()
+        old.process.join()
+        old.conn.close()
+        new = _Worker(index, self._ctx, self.module_kwargs)
+        new.restarts = old.restarts + 1
+        self.workers[index] = new
+        for user_id in list(self._user_roles):
+            if self.ring.get_shard(user_id) == index:
+                self._reopen_user(new, user_id)
+
+    def start_health_checks(self, interval: float = 10.0) -> asyncio.Task:
+        """启动后台健康检查任务。"""
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.check_health)
+                except Exception as e:
+                    # 单轮检查出错不能结束健康检查任务
+                    print(f"Error in memory shard health check: {e}")
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(loop())
+        return self._health_task
+
+    # ---------------------------------------------------------------------
+    # 后台压缩
+    # ---------------------------------------------------------------------
+    def start_compaction_job(self, interval: float = 3600, **policy) -> asyncio.Task:
+        """
+        启动后台压缩任务，每隔 interval 秒在各工作进程中对其用户调用 compact_raw_vectors。
+        policy 透传给 UserClient.compact_raw_vectors（min_age_seconds、keep_recent、batch_size）。
+        不同分片并行压缩，同一分片的用户依次压缩；压缩请求不设超时，避免耗时较长的压缩被当作无响应而重启进程。
+        """
+        if self._compaction_task is None or self._compaction_task.done():
+            self._compaction_task = asyncio.create_task(self._compaction_loop(interval, policy))
+        return self._compaction_task
+
+    def _compact_shard(self, user_ids: List[str], policy: Dict[str, Any]) -> List[Dict[str, Any]]:
+        shard_stats = []
+        for user_id in user_ids:
+            try:
+                stats = self._call_user(user_id, "compact_raw_vectors", _timeout=None, **policy)
+            except Exception as e:
+                print(f"Error compacting raw vectors for user {user_id}: {e}")
+                continue
+            shard_stats.append(stats)
+            if stats.get("moved"):
+                print(f"Compacted user {user_id}: moved {stats['moved']} vectors, "
+                      f"reclaimed {stats['hot_bytes_reclaimed']} bytes, "
+                      f"archive +{stats['archive_bytes_added']} bytes.")
+        return shard_stats
+
+    async def _compaction_loop(self, interval: float, policy: Dict[str, Any]):
+        while True:
+            shards: Dict[int, List[str]] = {}
+            for user_id in list(self.user_clients):
+                shards.setdefault(self.ring.get_shard(user_id), []).append(user_id)
+            results = await asyncio.gather(*(asyncio.to_thread(self._compact_shard, user_ids, policy)
+                                             for user_ids in shards.values()))
+            self.compaction_stats = [stats for shard_stats in results for stats in shard_stats]
+            await asyncio.sleep(interval)
+
+    async def shutdown(self):
+        """
+        关闭后台任务和所有工作进程。
+        """
+        for task in (self._health_task, self._compaction_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._health_task = None
+        self._compaction_task = None
+        await asyncio.gather(*(asyncio.to_thread(w.stop) for w in self.workers))
+        self.workers = []
+        self.user_clients.clear()
+        self._user_roles.clear()
+        self._unopened_users.clear()
+
+
+async def create_sharded_memory_module(**kwargs) -> ShardedMemoryModule:
+    """
+    异步工厂函数，负责创建和初始化 ShardedMemoryModule 实例，kwargs 透传给 ShardedMemoryModule。
+    """
+    module = ShardedMemoryModule(**kwargs)
+    await module._setup()
+    return module
+
+
+# =========================================================================
+# 吞吐基准：不同工作进程数量下，经 RemoteUserClient 代理的写入+检索吞吐
+# -------------------------------------------------------------------------
+async def _benchmark(worker_counts: List[int], backend: str, users: int, requests: int,
+                     milvus_host: str, milvus_port: str):
+    """每个请求对一个用户依次调用 insert_record 和 query_raw_memory，需要可用的Milvus服务。"""
+    texts = [f"第{i}句对话内容，用于测量分片记忆模块的吞吐。" * 4 for i in range(requests)]
+    baseline = None
+    for count in worker_counts:
+        module = await create_sharded_memory_module(num_workers=count, embedding_backend=backend,
+                                                    milvus_host=milvus_host, milvus_port=milvus_port)
+        clients = await asyncio.gather(*(asyncio.to_thread(module.start_user_client_instance, f"bench_user_{i}")
+                                         for i in range(users)))
+        # 预热：每个工作进程加载一次模型
+        warmup = {module.ring.get_shard(client.user_id): client for client in clients}
+        await asyncio.gather(*(asyncio.to_thread(client.query_raw_memory, texts[0], 1)
+                               for client in warmup.values()))
+
+        async def one(i):
+            client = clients[i % users]
+            await asyncio.to_thread(client.insert_record, {"role": "user", "text": texts[i]})
+            await asyncio.to_thread(client.query_raw_memory, texts[i], 3)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        await module.shutdown()
+
+        throughput = requests / elapsed
+        baseline = baseline or throughput
+        print(f"workers={count:<3d} {throughput:10.1f} requests/s  speedup x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="分片记忆模块的写入+检索吞吐基准")
+    parser.add_argument("--backend", default="fake", help="嵌入后端名称，见 embedding_backends.EMBEDDING_BACKENDS")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=256, help="请求数量，每个请求为一次写入和一次检索")
+    parser.add_argument("--milvus-host", default="localhost")
+    parser.add_argument("--milvus-port", default="19530")
+    args = parser.parse_args()
+
+    counts = sorted({1, *(2 ** i for i in range(1, args.max_workers.bit_length()) if 2 ** i <= args.max_workers),
+                     args.max_workers})
+    asyncio.run(_benchmark(counts, args.backend, args.users, args.requests, args.milvus_host, args.milvus_port))
@@ -31,6 +31,9 @@
 #       int, 摘要结束的Unix时间戳，作为过滤字段。
 #   summary_text:
 #       varchar(10k), 摘要的原始文本。此字段直接存储在 Milvus 中。
+#   start_id / end_id:
+#       bigint, 摘要覆盖的 user_dialogues id 区间（包含两端）。总结按id推进，导入的历史记录时间早但id大，
+#       按时间判断是否已总结并不可靠；冷存储压缩只归档落在某个摘要id区间内的记录。
 
 # =========================================================================
 # Milvus 向量集合设计 (存储所有向量和部分元数据)
@@ -44,6 +47,9 @@
 #       bigint, 主键，对应原始对话数据库中的唯一ID。
 #   embedding:
 #       float vector, 从 'text' 字段生成的嵌入向量。
+#
+# 集合名 raw_text_embeddings_<user_id> 是别名，指向物理集合 raw_text_embeddings_<user_id>_v<N>，
+# 更换嵌入模型后由 reindex.py 全量重建到新版本并切换别名。
 
 # ---
 
@@ -56,6 +62,9 @@
 #       bigint, 主键，唯一标识每条摘要记录。
 #   embedding:
 #       float vector, 从 'summary_text' 字段生成的嵌入向量。
+#
+# 与 raw_text_embeddings 相同，集合名 summary_collection_<user_id> 是别名，指向 summary_collection_<user_id>_v<N>，
+# 更换嵌入模型时由 reindex.py 与原始记忆向量一起重建并切换。
 
 # =========================================================================
 # 记忆模块对外接口设计
@@ -92,10 +101,12 @@ import sqlite3
 import json
 import time
 import os
-from typing import Optional, Dict, List, Tuple, Union, Any
+import asyncio
+from typing import Optional, Dict, List, Tuple, Union, Any, Iterable, Iterator
 from collections import deque
 import pymilvus
 from ABCs import InstantModule
+from sql_storage import SQLiteStorage
 
 from pymilvus import (
     connections,
@@ -103,28 +114,52 @@ from pymilvus import (
     FieldSchema, CollectionSchema, DataType,
     Collection,
 )
-from pymilvus.model.reranker import BGERerankFunction # 导入BGE Rerank函数
-from pymilvus.model.hybrid import BGEM3EmbeddingFunction # 导入BGE M3 Embedding函数
+from embedding_backends import EmbeddingBackend, create_embedding_backend, embedding_model_tag, encode_bucketed
+from retrieval_diversity import mmr_select, collapse_windows
+from memory_archive import ColdArchive, compact_raw_vectors
+
+# raw_text_embeddings / summary_collection 集合描述，创建时追加生成向量的模型标识
+RAW_TEXT_DESCRIPTION = "存储原始对话文本的嵌入向量"
+SUMMARY_DESCRIPTION = "存储对话摘要的嵌入向量和元数据"
+RAW_TEXT_MODEL_TAG_PREFIX = "; embedding="
 
 # =========================================================================
 # 嵌入函数 (Embedding Function)
 # -------------------------------------------------------------------------
 class MilvusEmbeddingFunction:
     """
-    使用 PyMilvus 提供的 BGEM3EmbeddingFunction 进行向量嵌入。
+    通过可插拔的 EmbeddingBackend 进行向量嵌入，默认使用 PyMilvus 提供的 BGEM3EmbeddingFunction。
     """
-    def __init__(self, model_name: str = "BAAI/bge-m3", device: str = "cpu", use_fp16: bool = False):
-        self.model = BGEM3EmbeddingFunction(model_name=model_name, device=device, use_fp16=use_fp16)
-        self.dim = self.model.dim # 获取嵌入维度
+    def __init__(self, model_name: str = "BAAI/bge-m3", device: str = "cpu", use_fp16: bool = False,
+                 backend: Optional[EmbeddingBackend] = None, batch_size: int = 16,
+                 model_tag: Optional[str] = None):
+        """
+        Args:
+            backend (Optional[EmbeddingBackend]): 嵌入后端，为空时按 model_name/device/use_fp16 创建 bge-m3 后端。
+            batch_size (int): 按长度分桶后每批嵌入的文本数量。
+            model_tag (Optional[str]): 模型标识，见 embedding_backends.embedding_model_tag，为空表示未知。
+        """
+        self.backend = backend if backend else create_embedding_backend(
+            "bge-m3", model_name=model_name, device=device, use_fp16=use_fp16)
+        self.batch_size = batch_size
+        self.dim = self.backend.dim # 获取嵌入维度
+        self.model_tag = model_tag
 
     def get_embedding(self, text: Union[str, List[str]]) -> List[List[float]]:
         """
-        生成文本的密集嵌入向量。
+        生成文本的密集嵌入向量，多条文本按长度分桶分批计算，结果与输入顺序一致。
         """
         if isinstance(text, str):
             text = [text]
-        embeddings = self.model.encode(text)['dense_vecs'].tolist()
-        return embeddings
+        return encode_bucketed(self.backend, text, batch_size=self.batch_size)
+
+
+def raw_text_model_tag(collection: Collection) -> Optional[str]:
+    """读取 raw_text_embeddings 或 summary_collection 集合描述中记录的模型标识，早期创建的集合没有记录，返回None。"""
+    description = collection.description or ""
+    if RAW_TEXT_MODEL_TAG_PREFIX not in description:
+        return None
+    return description.split(RAW_TEXT_MODEL_TAG_PREFIX, 1)[1]
 
 # =========================================================================
 # 记忆模块和用户客户端 (MemoryModule & UserClient)
@@ -137,14 +172,17 @@ class UserClient:
     def __init__(self, user_id: str,
                  embedding_function: MilvusEmbeddingFunction,
                  sql_db_path: Optional[str] = None,
-                 milvus_host: str = "localhost", milvus_port: str = "19530"):
+                 milvus_host: str = "localhost", milvus_port: str = "19530",
+                 role_template_dir: str = "role_templates",
+                 cold_search_threshold: float = 0.5):
         self.user_id = user_id
         self.embedding_function = embedding_function
         self.sql_db_path = sql_db_path if sql_db_path else f"user_data_{user_id}.db"
+        self.role_template_dir = role_template_dir # 角色模板目录，模板为 <角色名>.jsonl
         self.milvus_host = milvus_host
         self.milvus_port = milvus_port
 
-        self.sql_conn: Optional[sqlite3.Connection] = None
+        self.sql_storage: Optional[SQLiteStorage] = None
         self.milvus_alias = f"default_user_{user_id}"
 
         # 短期记忆库：使用deque实现，限定大小（例如200句或5k tokens）
@@ -158,19 +196,27 @@ class UserClient:
         self.raw_text_collection: Optional[Collection] = None
         self.summary_collection: Optional[Collection] = None
 
-        # 实例化BGE Rerank函数
-        self.bge_reranker = BGERerankFunction(device="cpu") # 假设在CPU上运行，可根据需要修改为cuda
+        # 原始记忆向量冷存储，已总结的旧向量由 compact_raw_vectors 移入
+        # 热集合和摘要的最高相似度都低于 cold_search_threshold 时才检索冷存储
+        self.cold_archive: Optional[ColdArchive] = None
+        self.cold_search_threshold = cold_search_threshold
 
-    def _connect_sql(self):
-        """连接到SQLite数据库。"""
-        if not self.sql_conn:
-            # 确保数据库文件所在目录存在
-            db_dir = os.path.dirname(self.sql_db_path)
-            if db_dir and not os.path.exists(db_dir):
-                os.makedirs(db_dir)
-            self.sql_conn = sqlite3.connect(self.sql_db_path)
-            self.sql_conn.row_factory = sqlite3.Row # 允许通过名称访问列
-        return self.sql_conn
+        # BGE Rerank函数在首次rerank时加载，见 bge_reranker
+        self.reranker_device = "cpu" # 假设在CPU上运行，可根据需要修改为cuda
+
+    @property
+    def bge_reranker(self):
+        """BGE Rerank函数，首次使用时加载，同一设备上的所有用户共享一个实例。"""
+        return _load_reranker(self.reranker_device)
+
+    def _connect_sql(self) -> SQLiteStorage:
+        """
+        连接到SQLite数据库。
+        数据库以WAL模式打开，写操作由单独的写线程group commit，读操作走只读连接池，可在多线程中并发使用。
+        """
+        if not self.sql_storage:
+            self.sql_storage = SQLiteStorage(self.sql_db_path).start()
+        return self.sql_storage
 
     def _connect_milvus(self):
         """连接到Milvus服务。"""
@@ -179,9 +225,9 @@ class UserClient:
         
     def close(self):
         """关闭所有数据库连接。"""
-        if self.sql_conn:
-            self.sql_conn.close()
-            self.sql_conn = None
+        if self.sql_storage:
+            self.sql_storage.close()
+            self.sql_storage = None
         try:
             if self.milvus_alias in connections.list_connections():
                 connections.remove_connection(self.milvus_alias)
@@ -191,76 +237,147 @@ class UserClient:
     def _create_user_databases(self, initial_role: Optional[str] = None):
         """
         创建并初始化用户的SQL和Milvus数据库。
+        若指定 initial_role 且用户库为空，则从 role_template_dir 下的角色模板初始化记忆库。
         """
-        # 连接SQL并创建表
-        conn = self._connect_sql()
-        cursor = conn.cursor()
-
-        # 创建 user_dialogues 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_dialogues (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                time INTEGER NOT NULL,
-                role TEXT NOT NULL,
-                text TEXT NOT NULL
-            );
-        """)
-
-        # 创建 summary 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS summary (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time INTEGER NOT NULL,
-                                end_time INTEGER NOT NULL,
-                summary_text TEXT NOT NULL
-            );
-        """)
-        conn.commit()
+        # 连接SQL并创建表，建表在写线程中以一个事务完成
+        def create_tables(conn: sqlite3.Connection):
+            # 创建 user_dialogues 表
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_dialogues (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    time INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    text TEXT NOT NULL
+                );
+            """)
+
+            # 创建 summary 表
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summary (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    start_time INTEGER NOT NULL,
+                    end_time INTEGER NOT NULL,
+                    summary_text TEXT NOT NULL,
+                    start_id INTEGER,
+                    end_id INTEGER
+                );
+            """)
+            # 早期创建的 summary 表没有id区间，补上列并按时间范围回填
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(summary);")}
+            for column in ("start_id", "end_id"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE summary ADD COLUMN {column} INTEGER;")
+            self._backfill_summary_id_ranges(conn)
+
+        self._connect_sql().run_in_writer(create_tables).result()
 
         # 连接Milvus
         self._connect_milvus()
         vector_dim = self.embedding_function.dim # 使用嵌入函数提供的维度
 
-        # 1. 定义 raw_text_embeddings 集合的 Schema
-        fields_raw_text = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vector_dim)
-        ]
-        schema_raw_text = CollectionSchema(fields_raw_text, "存储原始对话文本的嵌入向量")
-
-        # 2. 创建 raw_text_embeddings 集合并为其向量字段创建索引
+        # 1-2. 创建 raw_text_embeddings 集合
+        # 新用户的物理集合名带版本号，通过别名 raw_text_collection_name 访问，重建索引时切换别名即可原子替换。
+        # 早期创建的用户直接使用同名物理集合，首次全量重建时迁移为别名，见 reindex.switch_raw_text_alias
         if not utility.has_collection(self.raw_text_collection_name, using=self.milvus_alias):
-            self.raw_text_collection = Collection(self.raw_text_collection_name, schema_raw_text, using=self.milvus_alias)
-            # 为向量字段创建索引
-            index_params = {"metric_type":"COSINE", "index_type":"IVF_FLAT", "params":{"nlist":128}}
-            self.raw_text_collection.create_index(field_name="embedding", index_params=index_params)
-            print(f"Milvus collection '{self.raw_text_collection_name}' created with index.")
+            physical_name = self.versioned_raw_text_collection_name(1)
+            self._create_raw_text_collection(physical_name)
+            utility.create_alias(physical_name, self.raw_text_collection_name, using=self.milvus_alias)
+            print(f"Milvus collection '{physical_name}' created with index, alias '{self.raw_text_collection_name}'.")
         else:
-            self.raw_text_collection = Collection(self.raw_text_collection_name, using=self.milvus_alias)
             print(f"Milvus collection '{self.raw_text_collection_name}' already exists.")
+        self.raw_text_collection = Collection(self.raw_text_collection_name, using=self.milvus_alias)
         self.raw_text_collection.load()
+        collection_tag = raw_text_model_tag(self.raw_text_collection)
+        if collection_tag and self.embedding_function.model_tag and collection_tag != self.embedding_function.model_tag:
+            # 集合已由 reindex rebuild 切换到其他模型，继续写入会混入不兼容的向量
+            print(f"Warning: '{self.raw_text_collection_name}' holds '{collection_tag}' vectors but this service "
+                  f"embeds with '{self.embedding_function.model_tag}'; restart with the matching embedding backend.")
+
+        # 3-4. 创建 summary_collection 集合，与 raw_text_embeddings 一样通过别名访问版本化的物理集合
+        if not utility.has_collection(self.summary_collection_name, using=self.milvus_alias):
+            physical_name = self.versioned_summary_collection_name(1)
+            self._create_summary_collection(physical_name)
+            utility.create_alias(physical_name, self.summary_collection_name, using=self.milvus_alias)
+            print(f"Milvus collection '{physical_name}' created with index, alias '{self.summary_collection_name}'.")
+        else:
+            print(f"Milvus collection '{self.summary_collection_name}' already exists.")
+        self.summary_collection = Collection(self.summary_collection_name, using=self.milvus_alias)
+        self.summary_collection.load()
 
-        # 3. 定义 summary_collection 集合的 Milvus Schema
+        # 5. 打开原始记忆向量冷存储
+        archive_dir = os.path.dirname(self.sql_db_path)
+        self.cold_archive = ColdArchive(os.path.join(archive_dir, f"raw_archive_{self.user_id}"), vector_dim)
+
+        # 6. 从角色模板初始化记忆库（仅在用户库为空时）
+        if initial_role:
+            self._seed_from_role_template(initial_role)
+
+    def versioned_raw_text_collection_name(self, version: int) -> str:
+        """raw_text_embeddings 物理集合名，别名 raw_text_collection_name 指向其中一个版本。"""
+        return f"{self.raw_text_collection_name}_v{version}"
+
+    def _create_raw_text_collection(self, name: str) -> Collection:
+        """
+        创建一个 raw_text_embeddings 物理集合并为其向量字段创建索引，不加载。
+        """
+        fields_raw_text = [
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False), # id由SQL决定
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_function.dim)
+        ]
+        description = RAW_TEXT_DESCRIPTION
+        if self.embedding_function.model_tag:
+            description += f"{RAW_TEXT_MODEL_TAG_PREFIX}{self.embedding_function.model_tag}"
+        schema_raw_text = CollectionSchema(fields_raw_text, description)
+        collection = Collection(name, schema_raw_text, using=self.milvus_alias)
+        # 为向量字段创建索引
+        index_params = {"metric_type":"COSINE", "index_type":"IVF_FLAT", "params":{"nlist":128}}
+        collection.create_index(field_name="embedding", index_params=index_params)
+        return collection
+
+    def versioned_summary_collection_name(self, version: int) -> str:
+        """summary_collection 物理集合名，别名 summary_collection_name 指向其中一个版本。"""
+        return f"{self.summary_collection_name}_v{version}"
+
+    def _create_summary_collection(self, name: str) -> Collection:
+        """
+        创建一个 summary_collection 物理集合并为其向量字段创建索引，不加载。
+        """
         fields_summary = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vector_dim),
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False), # id由SQL决定
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_function.dim),
             FieldSchema(name="start_time", dtype=DataType.INT64),
             FieldSchema(name="end_time", dtype=DataType.INT64),
             FieldSchema(name="summary_text", dtype=DataType.VARCHAR, max_length=10000) # 对应SQL中的summary_text
         ]
-        schema_summary = CollectionSchema(fields_summary, "存储对话摘要的嵌入向量和元数据")
+        description = SUMMARY_DESCRIPTION
+        if self.embedding_function.model_tag:
+            description += f"{RAW_TEXT_MODEL_TAG_PREFIX}{self.embedding_function.model_tag}"
+        schema_summary = CollectionSchema(fields_summary, description)
+        collection = Collection(name, schema_summary, using=self.milvus_alias)
+        # 为向量字段创建索引
+        index_params = {"metric_type":"COSINE", "index_type":"IVF_FLAT", "params":{"nlist":128}}
+        collection.create_index(field_name="embedding", index_params=index_params)
+        return collection
+
+    def _seed_from_role_template(self, role_name: str):
+        """
+        从角色模板初始化记忆库，模板为JSONL格式，每行一条 {'role': ..., 'text': ..., 'time': 可选}。
+        Args:
+            role_name (str): 角色名，对应 role_template_dir 下的 <role_name>.jsonl。
+        """
+        from memory_io import iter_jsonl_records
 
-        # 4. 创建 summary_collection 集合并为其向量字段创建索引
-        if not utility.has_collection(self.summary_collection_name, using=self.milvus_alias):
-            self.summary_collection = Collection(self.summary_collection_name, schema_summary, using=self.milvus_alias)
-            # 为向量字段创建索引
-            index_params = {"metric_type":"COSINE", "index_type":"IVF_FLAT", "params":{"nlist":128}}
-            self.summary_collection.create_index(field_name="embedding", index_params=index_params)
-            print(f"Milvus collection '{self.summary_collection_name}' created with index.")
-        else:
-            self.summary_collection = Collection(self.summary_collection_name, using=self.milvus_alias)
-            print(f"Milvus collection '{self.summary_collection_name}' already exists.")
-        self.summary_collection.load()
+        template_path = os.path.join(self.role_template_dir, f"{role_name}.jsonl")
+        if not os.path.exists(template_path):
+            print(f"Error: role template {template_path} not found.")
+            return
+
+        if self._connect_sql().read_one("SELECT id FROM user_dialogues LIMIT 1;"):
+            print(f"User {self.user_id} already has dialogues, skip seeding role template '{role_name}'.")
+            return
+
+        inserted_ids = self.bulk_insert_records(iter_jsonl_records(template_path))
+        print(f"Seeded {len(inserted_ids)} records from role template '{role_name}'.")
 
     def _insert_raw_dialogue_to_sql(self, role: str, text: str) -> int:
         """
@@ -271,13 +388,9 @@ class UserClient:
         Returns:
             int: 插入记录的ID。
         """
-        conn = self._connect_sql()
-        cursor = conn.cursor()
         current_time = int(time.time())
-        cursor.execute("INSERT INTO user_dialogues (time, role, text) VALUES (?, ?, ?);",
-                       (current_time, role, text))
-        conn.commit()
-        return cursor.lastrowid
+        return self._connect_sql().write("INSERT INTO user_dialogues (time, role, text) VALUES (?, ?, ?);",
+                                         (current_time, role, text)).result()
 
     def _insert_to_milvus_raw_text(self, record_id: int, embedding: List[float]):
         """
@@ -298,6 +411,27 @@ class UserClient:
         except Exception as e:
             print(f"Error inserting raw text record_id {record_id} to Milvus: {e}")
 
+    def _insert_to_milvus_raw_text_batch(self, record_ids: List[int], embeddings: List[List[float]], flush: bool = True):
+        """
+        向 `raw_text_embeddings` 集合批量插入原始文本的嵌入向量。
+        Args:
+            record_ids (List[int]): 原始对话记录在SQL中的ID列表。
+            embeddings (List[List[float]]): 与 record_ids 一一对应的嵌入向量。
+            flush (bool): 是否在插入后立即flush，批量导入时由调用方在最后统一flush。
+        """
+        if not self.raw_text_collection:
+            print(f"Error: Milvus collection {self.raw_text_collection_name} not initialized.")
+            return
+        if not record_ids:
+            return
+
+        try:
+            self.raw_text_collection.insert([record_ids, embeddings])
+            if flush:
+                self.raw_text_collection.flush()
+        except Exception as e:
+            print(f"Error inserting raw text record_ids {record_ids[0]}..{record_ids[-1]} to Milvus: {e}")
+
     def _insert_to_milvus_summary(self, record_id: int, start_time: int, end_time: int, summary_text: str):
         """
         向 `summary_collection` 集合插入摘要的嵌入向量和元数据。
@@ -326,12 +460,14 @@ class UserClient:
         except Exception as e:
             print(f"Error inserting summary record_id {record_id} to Milvus: {e}")
 
-    def _query_milvus_raw_text(self, query_embedding: List[float], top_k: int = 3) -> List[Dict[str, Any]]:
+    def _query_milvus_raw_text(self, query_embedding: List[float], top_k: int = 3,
+                               hydrate: bool = True) -> List[Dict[str, Any]]:
         """
         在 `raw_text_embeddings` 集合中执行向量搜索，并返回匹配的原始对话文本及距离。
         Args:
             query_embedding (List[float]): 查询向量。
             top_k (int): 返回最相似的 top_k 结果。
+            hydrate (bool): 是否去SQL取回原文，为False时只返回 `id` 和 `distance`。
         Returns:
             List[Dict[str, Any]]: 匹配的原始对话记录列表，包含 `id`, `text`, `distance` 等信息。
         """
@@ -349,22 +485,91 @@ class UserClient:
                 output_fields=["id"]
             )
 
-            retrieved_results = []
-            conn = self._connect_sql()
-            cursor = conn.cursor()
+            hits = [{"id": hit.id, "distance": hit.distance} for hits in results for hit in hits]
+            hits = self._merge_cold_hits(query_embedding, hits, top_k)
+            if not hits or not hydrate:
+                return hits
 
-            for hits in results:
-                for hit in hits:
-                    # 根据Milvus返回的ID去SQL查询原始文本
-                    cursor.execute("SELECT text FROM user_dialogues WHERE id = ?;", (hit.id,))
-                    sql_result = cursor.fetchone()
-                    if sql_result:
-                        retrieved_results.append({"id": hit.id, "text": sql_result["text"], "distance": hit.distance})
+            # 根据命中ID一次性去SQL查询原始文本
+            placeholders = ",".join("?" * len(hits))
+            rows = self._connect_sql().read(f"SELECT id, text FROM user_dialogues WHERE id IN ({placeholders});",
+                                            [hit["id"] for hit in hits])
+            texts = {row["id"]: row["text"] for row in rows}
+
+            retrieved_results = []
+            for hit in hits:
+                if hit["id"] in texts:
+                    retrieved_results.append({"id": hit["id"], "text": texts[hit["id"]], "distance": hit["distance"]})
             return retrieved_results
         except Exception as e:
             print(f"Error querying Milvus raw text: {e}")
             return []
 
+    def _merge_cold_hits(self, query_embedding: List[float], hits: List[Dict[str, Any]],
+                         top_k: int) -> List[Dict[str, Any]]:
+        """
+        热集合结果较弱时检索冷存储：热集合最高相似度和摘要最高相似度都低于 cold_search_threshold 才检索，
+        冷热结果按相似度合并，取前 top_k 条。
+        """
+        if not self.cold_archive or not len(self.cold_archive):
+            return hits
+        if hits and max(h["distance"] for h in hits) >= self.cold_search_threshold:
+            return hits
+        summary_hits = self._query_milvus_summary(query_embedding, top_k=1)
+        if summary_hits and summary_hits[0]["distance"] >= self.cold_search_threshold:
+            return hits
+
+        merged = {h["id"]: h for h in self.cold_archive.search(query_embedding, top_k=top_k)}
+        merged.update({h["id"]: h for h in hits}) # 压缩中途可能冷热各有一份，以热集合为准
+        return sorted(merged.values(), key=lambda h: h["distance"], reverse=True)[:top_k]
+
+    def compact_raw_vectors(self, min_age_seconds: int = 7 * 24 * 3600, keep_recent: int = 200,
+                            batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        将已总结且足够旧的原始记忆向量从Milvus热集合移入冷存储，参数见 memory_archive.compact_raw_vectors。
+        Returns:
+            Dict[str, Any]: 统计信息，包含移动数量和回收的内存字节数。
+        """
+        if not self.cold_archive:
+            print(f"Error: cold archive for user {self.user_id} not initialized.")
+            return {}
+        return compact_raw_vectors(self, self.cold_archive, min_age_seconds=min_age_seconds,
+                                   keep_recent=keep_recent, batch_size=batch_size)
+
+    def _query_milvus_raw_spans(self, query_embedding: List[float], top_k: int = 3, diversity: float = 0.3,
+                                window_size: int = 5, candidate_factor: int = 3) -> List[Dict[str, Any]]:
+        """
+        多样化的原始记忆检索：取 top_k * candidate_factor 个候选，MMR选出 top_k 个，
+        再把窗口重叠的命中合并为id区间，并用一次SQL查询取回每个区间的原文。
+        Args:
+            query_embedding (List[float]): 查询向量。
+            top_k (int): MMR选出的命中数量，合并后区间数量不超过该值。
+            diversity (float): 多样性与相关度的权衡，0 表示只看相关度，1 表示只看多样性。
+            window_size (int): 嵌入时使用的滑动窗口大小。
+            candidate_factor (int): 候选数量相对 top_k 的倍数。
+        Returns:
+            List[Dict[str, Any]]: 区间列表，包含 `id`, `start_id`, `end_id`, `hit_ids`, `text`, `records`, `distance`。
+        """
+        hits = self._query_milvus_raw_text(query_embedding, top_k=top_k * candidate_factor, hydrate=False)
+        if not hits:
+            return []
+        spans = collapse_windows(mmr_select(hits, top_k, diversity, window_size), window_size)
+        return self._hydrate_spans(spans)
+
+    def _hydrate_spans(self, spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """用一次SQL查询取回所有id区间内的记录，区间原文按时间正序拼接。"""
+        if not spans:
+            return []
+        conditions = " OR ".join(["id BETWEEN ? AND ?"] * len(spans))
+        params = [bound for span in spans for bound in (span["start_id"], span["end_id"])]
+        rows = self._connect_sql().read(
+            f"SELECT id, time, role, text FROM user_dialogues WHERE {conditions} ORDER BY id ASC;", params)
+
+        for span in spans:
+            span["records"] = [row for row in rows if span["start_id"] <= row["id"] <= span["end_id"]]
+            span["text"] = " ".join(row["text"] for row in span["records"])
+        return [span for span in spans if span["records"]]
+
     def _query_milvus_summary(self, query_embedding: List[float], top_k: int = 3) -> List[Dict[str, Any]]:
         """
         在 `summary_collection` 集合中执行向量搜索，并返回匹配的摘要文本及距离。
@@ -411,12 +616,8 @@ class UserClient:
         Returns:
             List[Dict[str, Any]]: 最新的对话记录列表，每条记录是一个字典。
         """
-        conn = self._connect_sql()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT id, time, role, text FROM user_dialogues ORDER BY time DESC LIMIT {count};")
-        # SQLite `fetchall` returns a list of sqlite3.Row objects if row_factory is set
-        # Convert them to dicts for easier use
-        return [dict(row) for row in cursor.fetchall()]
+        return self._connect_sql().read("SELECT id, time, role, text FROM user_dialogues ORDER BY time DESC LIMIT ?;",
+                                        (count,))
 
     def _retrieve_summary_from_sql(self, max_end_time: Optional[int] = None, count: int = 1) -> List[Dict[str, Any]]:
         """
@@ -427,8 +628,6 @@ class UserClient:
         Returns:
             List[Dict[str, Any]]: 摘要记录列表，每条记录是一个字典。
         """
-        conn = self._connect_sql()
-        cursor = conn.cursor()
         query = "SELECT id, start_time, end_time, summary_text FROM summary "
         params = []
         if max_end_time is not None:
@@ -438,25 +637,155 @@ class UserClient:
             query += "ORDER BY end_time DESC LIMIT ?;"
             params = [count]
 
-        cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+        return self._connect_sql().read(query, params)
 
-    def _insert_summary_to_sql(self, start_time: int, end_time: int, summary_text: str) -> int:
+    @staticmethod
+    def _backfill_summary_id_ranges(conn: sqlite3.Connection):
+        """
+        为没有id区间的摘要（早期版本或旧导出文件）按 [start_time, end_time] 内记录的最小、最大id回填区间。
+        区间内没有记录的摘要回填为 (0, 0)，不覆盖任何记录，也不会在下次启动时重复计算。
+        """
+        conn.execute("""
+            UPDATE summary SET
+                start_id = COALESCE((SELECT MIN(d.id) FROM user_dialogues d
+                                     WHERE d.time BETWEEN summary.start_time AND summary.end_time), 0),
+                end_id = COALESCE((SELECT MAX(d.id) FROM user_dialogues d
+                                   WHERE d.time BETWEEN summary.start_time AND summary.end_time), 0)
+            WHERE start_id IS NULL OR end_id IS NULL;
+        """)
+
+    def _insert_summary_to_sql(self, start_time: int, end_time: int, summary_text: str,
+                               start_id: Optional[int] = None, end_id: Optional[int] = None) -> int:
         """
         向 `summary` 表插入摘要记录。
         Args:
             start_time (int): 摘要开始的Unix时间戳。
             end_time (int): 摘要结束的Unix时间戳。
             summary_text (str): 摘要的原始文本。
+            start_id (Optional[int]): 摘要覆盖的第一条记录ID。
+            end_id (Optional[int]): 摘要覆盖的最后一条记录ID。
         Returns:
             int: 插入记录的ID。
         """
-        conn = self._connect_sql()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO summary (start_time, end_time, summary_text) VALUES (?, ?, ?);",
-                       (start_time, end_time, summary_text))
-        conn.commit()
-        return cursor.lastrowid
+        return self._connect_sql().write(
+            "INSERT INTO summary (start_time, end_time, summary_text, start_id, end_id) VALUES (?, ?, ?, ?, ?);",
+            (start_time, end_time, summary_text, start_id, end_id)).result()
+
+    @staticmethod
+    def _build_context_text(window_texts: List[str]) -> str:
+        """
+        拼接上下文窗口文本，与 insert_record 保持一致（按时间倒序，最新一条在前）。
+        Args:
+            window_texts (List[str]): 按时间正序排列的窗口内文本。
+        """
+        return " ".join(reversed(window_texts))
+
+    def _iter_context_windows(self, start_id: int, end_id: Optional[int] = None,
+                              window_size: int = 5) -> Iterator[Tuple[int, str]]:
+        """
+        按id顺序流式读取 `user_dialogues`，为 [start_id, end_id] 内的每条记录构造滑动窗口上下文。
+        Args:
+            start_id (int): 起始记录ID（包含）。
+            end_id (Optional[int]): 结束记录ID（包含），为空则到表尾。
+            window_size (int): 滑动窗口大小，默认与 insert_record 一致为5。
+        Yields:
+            Tuple[int, str]: 记录ID及以其结尾的上下文窗口文本。
+        """
+        storage = self._connect_sql()
+        # 取起始记录之前的 window_size-1 条作为第一个窗口的上文
+        previous = storage.read("SELECT text FROM user_dialogues WHERE id < ? ORDER BY id DESC LIMIT ?;",
+                                (start_id, window_size - 1))
+        window: deque[str] = deque((row["text"] for row in reversed(previous)), maxlen=window_size)
+
+        query = "SELECT id, text FROM user_dialogues WHERE id >= ? "
+        params: List[Any] = [start_id]
+        if end_id is not None:
+            query += "AND id <= ? "
+            params.append(end_id)
+        query += "ORDER BY id ASC;"
+
+        for row in storage.iter_read(query, params):
+            window.append(row["text"])
+            yield row["id"], self._build_context_text(list(window))
+
+    def _embed_windows_from_sql(self, start_id: int, end_id: Optional[int] = None,
+                                batch_size: int = 64, window_size: int = 5, flush: bool = True) -> int:
+        """
+        为 [start_id, end_id] 内的每条记录构造滑动窗口上下文，分批嵌入后批量写入Milvus。
+        Args:
+            start_id (int): 起始记录ID（包含）。
+            end_id (Optional[int]): 结束记录ID（包含），为空则到表尾。
+            batch_size (int): 每批嵌入的窗口数量。
+            window_size (int): 滑动窗口大小，默认与 insert_record 一致为5。
+            flush (bool): 是否在全部插入后flush一次。
+        Returns:
+            int: 写入Milvus的向量数量。
+        """
+        batch_ids: List[int] = []
+        batch_texts: List[str] = []
+        total = 0
+        for record_id, context_text in self._iter_context_windows(start_id, end_id, window_size):
+            batch_ids.append(record_id)
+            batch_texts.append(context_text)
+            if len(batch_ids) >= batch_size:
+                embeddings = self.embedding_function.get_embedding(batch_texts)
+                self._insert_to_milvus_raw_text_batch(batch_ids, embeddings, flush=False)
+                total += len(batch_ids)
+                batch_ids, batch_texts = [], []
+        if batch_ids:
+            embeddings = self.embedding_function.get_embedding(batch_texts)
+            self._insert_to_milvus_raw_text_batch(batch_ids, embeddings, flush=False)
+            total += len(batch_ids)
+
+        if flush and total and self.raw_text_collection:
+            self.raw_text_collection.flush()
+        return total
+
+    def bulk_insert_records(self, records: Iterable[Dict[str, Any]], embed_batch_size: int = 64) -> List[int]:
+        """
+        批量插入记录：所有记录在一个SQL事务中写入，随后按id顺序计算滑动窗口嵌入并批量写入Milvus，只flush一次。
+        records 示例: [{'role': 'user', 'text': '你好'}, {'role': 'chatbot', 'text': '你好呀', 'time': 1700000000}]
+        time 可选，缺省或为null时由服务端确定；缺少role/text或time无法解析的记录跳过并打印警告。
+        Returns:
+            List[int]: 插入记录的ID列表。
+        """
+        current_time = int(time.time())
+
+        # 1. 在写线程中单事务流式写入SQL
+        def insert_all(conn: sqlite3.Connection) -> List[int]:
+            ids = []
+            for record in records:
+                if not isinstance(record, dict):
+                    print(f"Warning: skip record that is not an object: {record!r}")
+                    continue
+                role = record.get('role')
+                text = record.get('text')
+                if not role or not text:
+                    print(f"Warning: skip record without 'role' or 'text': {record}")
+                    continue
+                record_time = _parse_record_time(record.get('time'), current_time)
+                if record_time is None:
+                    print(f"Warning: skip record with invalid 'time': {record}")
+                    continue
+                cursor = conn.execute("INSERT INTO user_dialogues (time, role, text) VALUES (?, ?, ?);",
+                                      (record_time, role, text))
+                ids.append(cursor.lastrowid)
+                self.short_term_memory.append(text)
+            return ids
+
+        try:
+            inserted_ids = self._connect_sql().run_in_writer(insert_all).result()
+        except sqlite3.Error as e:
+            print(f"Error bulk inserting raw dialogues to SQL: {e}")
+            return []
+
+        if not inserted_ids:
+            return inserted_ids
+
+        # 2. 滑动窗口嵌入，批量写入Milvus
+        count = self._embed_windows_from_sql(inserted_ids[0], inserted_ids[-1], batch_size=embed_batch_size)
+        print(f"Bulk inserted {len(inserted_ids)} records, {count} context embeddings inserted to Milvus.")
+        return inserted_ids
 
     def insert_record(self, record_dict: Dict[str, Any]):
         """
@@ -496,17 +825,16 @@ class UserClient:
 
     def summarize_memory(self):
         """
-        从总结库获取最大的已总结end_time，将那之后的raw text总结，假定总结的函数已经写好，然后存入总结库。
+        从总结库获取已总结到的最大记录id，将那之后的raw text总结，假定总结的函数已经写好，然后存入总结库。
+        按id而不是时间推进：批量导入的历史记录时间早但id大，按时间会被永远跳过。
         """
-        # 1. 从总结库获取最大的已总结end_time
-        latest_summary = self._retrieve_summary_from_sql(count=1)
-        max_end_time = latest_summary[0]['end_time'] if latest_summary else 0
+        # 1. 从总结库获取已总结到的最大记录id
+        latest = self._connect_sql().read_one("SELECT MAX(end_id) AS end_id FROM summary;")
+        max_end_id = latest["end_id"] or 0
 
-        # 2. 检索该end_time之后的所有原始对话记录
-        conn = self._connect_sql()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, time, role, text FROM user_dialogues WHERE time > ? ORDER BY time ASC;", (max_end_time,))
-        raw_dialogues_to_summarize = [dict(row) for row in cursor.fetchall()]
+        # 2. 检索该id之后的所有原始对话记录
+        raw_dialogues_to_summarize = self._connect_sql().read(
+            "SELECT id, time, role, text FROM user_dialogues WHERE id > ? ORDER BY id ASC;", (max_end_id,))
 
         if not raw_dialogues_to_summarize:
             print("No new raw dialogues to summarize.")
@@ -520,12 +848,14 @@ class UserClient:
         # TODO: 替换为实际的LLM总结函数
         summarized_text = _summarize_placeholder_func(full_text_to_summarize)
 
-        # 获取总结的开始和结束时间
-        summary_start_time = raw_dialogues_to_summarize[0]['time']
-        summary_end_time = raw_dialogues_to_summarize[-1]['time']
+        # 获取总结的开始和结束时间，导入的记录时间不一定随id递增
+        summary_start_time = min(d['time'] for d in raw_dialogues_to_summarize)
+        summary_end_time = max(d['time'] for d in raw_dialogues_to_summarize)
 
         # 4. 将总结结果插入到SQL summary表
-        summary_id = self._insert_summary_to_sql(summary_start_time, summary_end_time, summarized_text)
+        summary_id = self._insert_summary_to_sql(summary_start_time, summary_end_time, summarized_text,
+                                                 raw_dialogues_to_summarize[0]['id'],
+                                                 raw_dialogues_to_summarize[-1]['id'])
         if not summary_id:
             print(f"Error: Failed to insert summary to SQL for text: {summarized_text}")
             return
@@ -534,10 +864,20 @@ class UserClient:
         self._insert_to_milvus_summary(summary_id, summary_start_time, summary_end_time, summarized_text)
         print(f"Summary ID {summary_id} inserted to SQL and Milvus.")
 
-    def query_raw_memory(self, query_data: Union[str, List[str], List[float]], top_k: int = 3) -> List[Dict[str, Any]]:
+    def _search_raw_text(self, query_embedding: List[float], top_k: int, diversity: Optional[float],
+                         window_size: int) -> List[Dict[str, Any]]:
+        """根据是否指定 diversity 选择普通检索或多样化检索。"""
+        if diversity is None:
+            return self._query_milvus_raw_text(query_embedding, top_k=top_k)
+        return self._query_milvus_raw_spans(query_embedding, top_k=top_k, diversity=diversity, window_size=window_size)
+
+    def query_raw_memory(self, query_data: Union[str, List[str], List[float]], top_k: int = 3,
+                         diversity: Optional[float] = None, window_size: int = 5) -> List[Dict[str, Any]]:
         """
         查询相关原始记忆。
         可以接受输入向量或list或文本，但前面这些至少有一个，接受top k默认3。
+        diversity 不为空时启用多样化检索：相邻窗口重叠的命中合并为一个id区间，结果额外包含
+        `start_id`, `end_id`, `hit_ids`, `records`，diversity 越大越偏向多样性（见 _query_milvus_raw_spans）。
         """
         query_embedding: Optional[List[float]] = None
         results: List[Dict[str, Any]] = []
@@ -546,21 +886,17 @@ class UserClient:
         if isinstance(query_data, list) and all(isinstance(i, float) for i in query_data):
             # 如果是向量，直接用向量在raw text里面查询
             query_embedding = query_data
-            results = self._query_milvus_raw_text(query_embedding, top_k=top_k)
+            results = self._search_raw_text(query_embedding, top_k, diversity, window_size)
         elif isinstance(query_data, list) and all(isinstance(i, str) for i in query_data):
             # 如果是list，假定该list是上下文，嵌入后查询
             query_text = " ".join(query_data)
             query_embedding = self.embedding_function.get_embedding(query_text)[0]
-            results = self._query_milvus_raw_text(query_embedding, top_k=top_k)
+            results = self._search_raw_text(query_embedding, top_k, diversity, window_size)
         elif isinstance(query_data, str):
             # 如果是文本，假定是一句话
             query_text = query_data
-            conn = self._connect_sql()
-            cursor = conn.cursor()
-
             # 尝试从SQL里面做完全匹配
-            cursor.execute("SELECT id, text FROM user_dialogues WHERE text = ?;", (query_data,))
-            sql_match = cursor.fetchone()
+            sql_match = self._connect_sql().read_one("SELECT id, text FROM user_dialogues WHERE text = ?;", (query_data,))
 
             if sql_match:
                 # 如果匹配到，根据ID查询Milvus
@@ -576,7 +912,7 @@ class UserClient:
                 context_texts.append(query_data) # 将新查询文本也加入上下文
                 full_context_text = " ".join(context_texts)
                 query_embedding = self.embedding_function.get_embedding(full_context_text)[0]
-                results = self._query_milvus_raw_text(query_embedding, top_k=top_k)
+                results = self._search_raw_text(query_embedding, top_k, diversity, window_size)
         else:
             print("Error: Unsupported query_data type.")
             return []
@@ -643,11 +979,36 @@ class MemoryModule(InstantModule):
     """
     记忆模块的整体实例，管理所有用户的UserClient实例。
     """
-    def __init__(self, milvus_host: str = "localhost", milvus_port: str = "19530"):
+    def __init__(self, milvus_host: str = "localhost", milvus_port: str = "19530",
+                 embedding_backend: str = "bge-m3", embedding_options: Optional[Dict[str, Any]] = None,
+                 embedding_batch_size: int = 16, cold_search_threshold: float = 0.5):
+        """
+        Args:
+            embedding_backend (str): 嵌入后端名称，见 embedding_backends.EMBEDDING_BACKENDS。
+            embedding_options (Optional[Dict[str, Any]]): 透传给嵌入后端的参数，如 max_tokens、num_threads。
+            embedding_batch_size (int): 按长度分桶后每批嵌入的文本数量。
+            cold_search_threshold (float): 热集合和摘要的最高相似度都低于该值时才检索冷存储，传给每个 UserClient。
+        """
         super().__init__() # 调用父类的__init__方法
         self.user_clients: Dict[str, UserClient] = {}
         self.milvus_host = milvus_host
         self.milvus_port = milvus_port
+        self.embedding_backend = embedding_backend
+        self.embedding_options = embedding_options or {}
+        self.embedding_batch_size = embedding_batch_size
+        self.cold_search_threshold = cold_search_threshold
+        self.embedding_function: Optional[MilvusEmbeddingFunction] = None # 所有用户共享一个嵌入模型
+        self._compaction_task: Optional[asyncio.Task] = None
+        self.compaction_stats: List[Dict[str, Any]] = [] # 最近一轮压缩各用户的统计信息
+
+    def _get_embedding_function(self) -> MilvusEmbeddingFunction:
+        """首次使用时创建嵌入函数，之后所有用户共享。"""
+        if self.embedding_function is None:
+            backend = create_embedding_backend(self.embedding_backend, **self.embedding_options)
+            self.embedding_function = MilvusEmbeddingFunction(
+                backend=backend, batch_size=self.embedding_batch_size,
+                model_tag=embedding_model_tag(self.embedding_backend, self.embedding_options))
+        return self.embedding_function
 
     async def _setup(self):
         # 建立全局Milvus连接，用于管理连接和utility操作
@@ -655,36 +1016,65 @@ class MemoryModule(InstantModule):
             connections.connect(alias="default", host=self.milvus_host, port=self.milvus_port)
             self._is_ready.set()
 
-    def start_user_client_instance(self, user_id: str) -> UserClient:
+    def start_user_client_instance(self, user_id: str, initial_role: Optional[str] = None) -> UserClient:
         """
         启动一个用户接口实例，保存用户信息。
+        initial_role 为可选的角色模板名，新用户将从该模板初始化记忆库。
         """
         if user_id in self.user_clients:
             print(f"UserClient for {user_id} already exists. Returning existing instance.")
             return self.user_clients[user_id]
         
-        # 在这里实例化 MilvusEmbeddingFunction，并传递给 UserClient
-        embedding_function_instance = MilvusEmbeddingFunction(
-            model_name='BAAI/bge-m3',
-            device='cpu',
-            use_fp16=False
-        )
-        
         client = UserClient(user_id=user_id,
-                            embedding_function=embedding_function_instance,
+                            embedding_function=self._get_embedding_function(),
                             milvus_host=self.milvus_host,
-                            milvus_port=self.milvus_port)
+                            milvus_port=self.milvus_port,
+                            cold_search_threshold=self.cold_search_threshold)
         self.user_clients[user_id] = client
         
         # 自动创建数据库
-        client._create_user_databases()
+        client._create_user_databases(initial_role=initial_role)
         
         return client
 
+    def start_compaction_job(self, interval: float = 3600, **policy) -> asyncio.Task:
+        """
+        启动后台压缩任务，每隔 interval 秒把所有用户已总结的旧原始记忆向量移入冷存储。
+        policy 透传给 UserClient.compact_raw_vectors（min_age_seconds、keep_recent、batch_size）。
+        """
+        if self._compaction_task is None or self._compaction_task.done():
+            self._compaction_task = asyncio.create_task(self._compaction_loop(interval, policy))
+        return self._compaction_task
+
+    async def _compaction_loop(self, interval: float, policy: Dict[str, Any]):
+        while True:
+            round_stats = []
+            for user_id, client in list(self.user_clients.items()):
+                try:
+                    stats = await asyncio.to_thread(client.compact_raw_vectors, **policy)
+                except Exception as e:
+                    print(f"Error compacting raw vectors for user {user_id}: {e}")
+                    continue
+                round_stats.append(stats)
+                if stats.get("moved"):
+                    print(f"Compacted user {user_id}: moved {stats['moved']} vectors, "
+                          f"reclaimed {stats['hot_bytes_reclaimed']} bytes, "
+                          f"archive +{stats['archive_bytes_added']} bytes.")
+            self.compaction_stats = round_stats
+            await asyncio.sleep(interval)
+
     async def shutdown(self):
         """
-        关闭记忆模块，包括所有用户客户端和全局Milvus连接。
+        关闭记忆模块，包括后台压缩任务、所有用户客户端和全局Milvus连接。
         """
+        if self._compaction_task is not None:
+            self._compaction_task.cancel()
+            try:
+                await self._compaction_task
+            except asyncio.CancelledError:
+                pass
+            self._compaction_task = None
+
         # 关闭所有活跃的用户客户端
         for user_id in list(self.user_clients.keys()):
             self.close_user_client_instance(user_id)
@@ -712,6 +1102,39 @@ class MemoryModule(InstantModule):
         """获取指定user_id的UserClient实例。"""
         return self.user_clients.get(user_id)
 
+async def create_memory_module(**kwargs) -> MemoryModule:
+    """
+    异步工厂函数，负责创建和初始化 MemoryModule 实例，kwargs 透传给 MemoryModule。
+    嵌入和Rerank模型不在此处加载，而是在首次使用时加载。
+    """
+    module = MemoryModule(**kwargs)
+    await module._setup()
+    return module
+
+def _parse_record_time(value: Any, default: int) -> Optional[int]:
+    """
+    解析导入记录的 time 字段：缺省或为null时使用 default，数字或数字字符串取整，其他值返回None。
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return None
+    try:
+        record_time = int(float(value)) if isinstance(value, str) else int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # SQLite INTEGER 为64位有符号整数
+    return record_time if -2**63 <= record_time < 2**63 else None
+
+_rerankers: Dict[str, Any] = {}
+
+def _load_reranker(device: str):
+    """按设备缓存BGE Rerank函数，pymilvus.model（及其依赖的torch/transformers）只在这里导入。"""
+    if device not in _rerankers:
+        from pymilvus.model.reranker import BGERerankFunction # 导入BGE Rerank函数
+        _rerankers[device] = BGERerankFunction(device=device)
+    return _rerankers[device]
+
 # 总结函数占位符
 def _summarize_placeholder_func(text: str) -> str:
     """
@@ -0,0 +1,62 @@
+
+# =========================================================================
+# 输出解析 (Output Parser)
+# -------------------------------------------------------------------------
+# 流式解析基础模型的输出：由 <motion>动作</motion> 包装的内容作为动作指令，其余作为纯文本。
+# 模型输出按token流式到达，标签可能被拆分在多个片段中，未闭合的标签会留在缓冲区等待后续片段。
+
+import re
+from typing import List, Tuple
+
+MOTION_OPEN = "<motion>"
+MOTION_CLOSE = "</motion>"
+MOTION_PATTERN = re.compile(r"<motion>(.*?)</motion>", re.S)
+
+
+class MotionStreamParser:
+    """
+    流式解析器，feed 每次返回已经可以确定的片段列表，片段为 ("motion", 动作名) 或 ("text", 文本)。
+    """
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self._buffer += chunk
+        events: List[Tuple[str, str]] = []
+        while self._buffer:
+            start = self._buffer.find(MOTION_OPEN)
+            if start == -1:
+                # 末尾可能是被拆开的开始标签，保留可能的前缀
+                keep = self._partial_prefix_length(self._buffer)
+                text, self._buffer = self._buffer[:len(self._buffer) - keep], self._buffer[len(self._buffer) - keep:]
+                if text:
+                    events.append(("text", text))
+                break
+            if start > 0:
+                events.append(("text", self._buffer[:start]))
+                self._buffer = self._buffer[start:]
+            end = self._buffer.find(MOTION_CLOSE)
+            if end == -1:
+                break # 等待闭合标签
+            motion = self._buffer[len(MOTION_OPEN):end].strip()
+            if motion:
+                events.append(("motion", motion))
+            self._buffer = self._buffer[end + len(MOTION_CLOSE):]
+        return events
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """输出结束时调用，缓冲区中剩余内容（包括未闭合的标签）作为纯文本返回。"""
+        text, self._buffer = self._buffer, ""
+        return [("text", text)] if text else []
+
+    @staticmethod
+    def _partial_prefix_length(text: str) -> int:
+        for length in range(min(len(MOTION_OPEN) - 1, len(text)), 0, -1):
+            if MOTION_OPEN.startswith(text[-length:]):
+                return length
+        return 0
+
+
+def strip_motions(text: str) -> str:
+    """去掉完整输出中的动作标签，只保留纯文本。"""
+    return MOTION_PATTERN.sub("", text)
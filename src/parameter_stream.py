@@ -0,0 +1,216 @@
+
+# =========================================================================
+# 参数流 (Parameter Stream)
+# -------------------------------------------------------------------------
+# 口型等连续动作需要以30-60Hz持续注入VTS参数，热键那样逐条等待的请求方式跟不上。
+# 这里按固定帧率的时钟驱动：
+#   第n帧的截止时间 = start + n * period，不随发送耗时累积漂移
+#   某帧错过截止时间（事件循环繁忙）就直接丢弃，不排队补发
+#   发送在后台任务中进行，时钟不等待发送完成；上一帧仍在发送时跳过本帧（计入 frames_busy），
+#   发送变慢或对端不再回复时只会降低实际注入的帧数，不会拖慢或卡住时钟
+#   每帧汇总所有 producer 的参数值，合并为一个 InjectParameterDataRequest 发送
+# producer 按时间采样参数值，例如由TTS音频振幅包络驱动 MouthOpen。
+
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+
+class ParameterProducer(ABC):
+    """参数来源，每帧按当前时间采样一次。"""
+    @abstractmethod
+    def sample(self, now: float) -> Dict[str, float]:
+        """
+        Args:
+            now (float): time.perf_counter() 时间。
+        Returns:
+            Dict[str, float]: 参数名到值的映射，空表示本帧没有要注入的参数。
+        """
+        pass
+
+
+class EnvelopeProducer(ParameterProducer):
+    """
+    按振幅包络驱动一个参数（默认 MouthOpen），包络播放完后不再输出。
+    """
+    def __init__(self, parameter: str = "MouthOpen", gain: float = 1.0):
+        self.parameter = parameter
+        self.gain = gain
+        self._envelope: List[float] = []
+        self._rate = 0.0
+        self._start = 0.0
+
+    def play(self, envelope: Sequence[float], rate: float, start: Optional[float] = None):
+        """
+        播放一段包络，覆盖正在播放的包络。
+        Args:
+            envelope (Sequence[float]): 0-1之间的振幅序列。
+            rate (float): 包络的采样率（每秒点数）。
+            start (Optional[float]): 开始播放的 perf_counter 时间，为空则立即开始，用于和音频播放对齐。
+        """
+        self._envelope = list(envelope)
+        self._rate = rate
+        self._start = time.perf_counter() if start is None else start
+
+    def extend(self, envelope: Sequence[float], rate: float):
+        """
+        在正在播放的包络后接着播放，用于流式TTS逐段到达的音频；没有在播放或采样率不同时等同于 play。
+        """
+        if self._envelope and rate == self._rate:
+            self._envelope.extend(envelope)
+        else:
+            self.play(envelope, rate)
+
+    def stop(self):
+        self._envelope = []
+
+    def sample(self, now: float) -> Dict[str, float]:
+        if not self._envelope:
+            return {}
+        position = (now - self._start) * self._rate
+        if position < 0:
+            return {}
+        index = int(position)
+        if index >= len(self._envelope) - 1:
+            self._envelope = []
+            return {self.parameter: 0.0} # 播放结束时闭嘴
+        # 在相邻两点间线性插值，帧率和包络采样率不必一致
+        frac = position - index
+        value = self._envelope[index] * (1 - frac) + self._envelope[index + 1] * frac
+        return {self.parameter: min(1.0, value * self.gain)}
+
+
+class StaticProducer(ParameterProducer):
+    """保持一组参数值（例如表情），直到被修改或清除。"""
+    def __init__(self):
+        self.values: Dict[str, float] = {}
+
+    def set(self, parameter: str, value: float):
+        self.values[parameter] = value
+
+    def clear(self, parameter: Optional[str] = None):
+        if parameter is None:
+            self.values.clear()
+        else:
+            self.values.pop(parameter, None)
+
+    def sample(self, now: float) -> Dict[str, float]:
+        return dict(self.values)
+
+
+def amplitude_envelope(samples: Sequence[float], sample_rate: int, frame_rate: float = 60.0) -> List[float]:
+    """
+    由音频采样计算归一化的RMS振幅包络，可直接交给 EnvelopeProducer.play(envelope, frame_rate)。
+    Args:
+        samples (Sequence[float]): 单声道音频采样（float或int16均可）。
+        sample_rate (int): 音频采样率。
+        frame_rate (float): 包络的采样率。
+    """
+    window = max(1, int(sample_rate / frame_rate))
+    envelope = []
+    for start in range(0, len(samples), window):
+        chunk = samples[start:start + window]
+        envelope.append(math.sqrt(sum(float(s) * float(s) for s in chunk) / len(chunk)))
+    peak = max(envelope, default=0.0)
+    return [v / peak for v in envelope] if peak else envelope
+
+
+class ParameterStream:
+    """
+    固定帧率的参数注入循环。
+    Args:
+        send (Callable[[Dict[str, float]], Awaitable[None]]): 发送一帧合并后的参数值。
+        fps (float): 目标帧率。
+        producers (Optional[List[ParameterProducer]]): 参数来源，同名参数以后加入的为准。
+    """
+    def __init__(self, send: Callable[[Dict[str, float]], Awaitable[None]], fps: float = 60.0,
+                 producers: Optional[List[ParameterProducer]] = None, jitter_window: int = 1000):
+        self.send = send
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.producers: List[ParameterProducer] = list(producers or [])
+        self.frames_sent = 0
+        self.frames_idle = 0 # 没有参数需要注入的帧
+        self.frames_dropped = 0
+        self.frames_busy = 0 # 上一帧仍在发送而跳过的帧
+        self.send_errors = 0
+        self._jitter: Deque[float] = deque(maxlen=jitter_window)
+        self._started_at: Optional[float] = None
+        self._running = False
+        self._in_flight: Optional[asyncio.Task] = None
+
+    def add_producer(self, producer: ParameterProducer):
+        self.producers.append(producer)
+
+    def collect(self, now: float) -> Dict[str, float]:
+        values: Dict[str, float] = {}
+        for producer in self.producers:
+            values.update(producer.sample(now))
+        return values
+
+    async def _send_frame(self, values: Dict[str, float]):
+        try:
+            await self.send(values)
+            self.frames_sent += 1
+        except Exception as e:
+            self.send_errors += 1
+            print(f"Error sending parameter frame: {e}")
+
+    async def run(self):
+        """运行直到被取消或调用 stop。"""
+        self._running = True
+        start = time.perf_counter()
+        self._started_at = start
+        frame = 0
+        try:
+            while self._running:
+                deadline = start + frame * self.period
+                now = time.perf_counter()
+                if now > deadline + self.period:
+                    # 已经错过了这一帧的发送窗口，丢弃并对齐到下一个未来的截止时间
+                    missed = int((now - deadline) / self.period)
+                    self.frames_dropped += missed
+                    frame += missed
+                    continue
+                if now < deadline:
+                    await asyncio.sleep(deadline - now)
+                    now = time.perf_counter()
+                self._jitter.append(now - deadline)
+
+                values = self.collect(now)
+                if not values:
+                    self.frames_idle += 1
+                elif self._in_flight is not None and not self._in_flight.done():
+                    self.frames_busy += 1
+                else:
+                    self._in_flight = asyncio.create_task(self._send_frame(values))
+                frame += 1
+        finally:
+            if self._in_flight is not None:
+                self._in_flight.cancel()
+                await asyncio.gather(self._in_flight, return_exceptions=True)
+
+    def stop(self):
+        self._running = False
+
+    def stats(self) -> Dict[str, float]:
+        """实际帧率（按时钟帧计，包括空闲帧和因上一帧仍在发送而跳过的帧）、丢帧数和相对截止时间的抖动（毫秒）。"""
+        elapsed = time.perf_counter() - self._started_at if self._started_at is not None else 0.0
+        ticks = self.frames_sent + self.frames_idle + self.frames_busy + self.send_errors
+        jitter = sorted(self._jitter)
+        to_ms = lambda v: round(v * 1000, 3)
+        return {
+            "fps_target": self.fps,
+            "fps_actual": round(ticks / elapsed, 2) if elapsed else 0.0,
+            "frames_sent": self.frames_sent,
+            "frames_idle": self.frames_idle,
+            "frames_dropped": self.frames_dropped,
+            "frames_busy": self.frames_busy,
+            "send_errors": self.send_errors,
+            "jitter_mean_ms": to_ms(sum(jitter) / len(jitter)) if jitter else 0.0,
+            "jitter_p99_ms": to_ms(jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))]) if jitter else 0.0,
+            "jitter_max_ms": to_ms(jitter[-1]) if jitter else 0.0,
+        }
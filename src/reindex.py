@@ -0,0 +1,554 @@
+
+# =========================================================================
+# 原始记忆向量重建与对账 (Reindex & Reconcile)
+# -------------------------------------------------------------------------
+# insert_record 写Milvus失败时只打印错误，SQL记录仍在但向量丢失；更换嵌入模型后旧向量也需要全部重建。
+# 本工具离线或在服务运行时后台执行，两种模式：
+#   reconcile   按用户对比 user_dialogues 的id与 raw_text_embeddings（及冷存储）中的id，
+#               报告缺失向量和孤儿向量，--repair 时重建缺失窗口、删除孤儿向量
+#   rebuild     全量重新嵌入到新版本物理集合，追平期间新增的记录后原子切换别名
+# 两种模式都按id顺序流式读取SQL，单线程嵌入（分词器不是线程安全的，torch在一次前向内已用满所有核），
+# 多线程并行写入Milvus，写入使用upsert，重复写入同一id是安全的。
+# 进度按用户记录在检查点JSON中，中断后以相同参数重新运行即可从检查点继续。
+#   python reindex.py rebuild --data-dir . --all [--workers 4] [--checkpoint reindex_checkpoint.json]
+# rebuild 同时把摘要重新嵌入到新版本的 summary_collection，与原始记忆向量在同一步切换别名。
+# 已归档到冷存储的记录不会回到热集合：模型不变时冷存储保留，更换模型时重新嵌入到新的冷存储文件。
+# 集合描述和检查点中记录嵌入模型标识（见 embedding_backends.embedding_model_tag）：
+#   更换模型的重建必须加 --model-change，否则拒绝执行。别名切换后，仍按旧模型运行的服务会继续向新集合写入旧模型向量，
+#   因此切换时必须以新的 embedding_backend 配置重启所有服务，重启后运行 reconcile --repair，
+#   按检查点重新嵌入切换后写入的记录。reconcile 发现工具与集合的模型不一致时只报告、不修复。
+
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pymilvus import Collection, utility
+
+from config import load_config
+from embedding_backends import create_embedding_backend, embedding_model_tag
+from memory_archive import ColdArchive
+from milvus_database import MilvusEmbeddingFunction, UserClient, raw_text_model_tag
+
+
+class Checkpoint:
+    """
+    按用户记录重建进度，每批完成后原子写入JSON文件。
+    """
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self.users: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.users = json.load(f).get("users", {})
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        return dict(self.users.get(user_id, {}))
+
+    def update(self, user_id: str, **fields):
+        with self._lock:
+            self.users.setdefault(user_id, {}).update(fields, updated_at=int(time.time()))
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"users": self.users}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def _batched(items: Iterable[Tuple[int, str]], batch_size: int) -> Iterator[Tuple[List[int], List[str]]]:
+    ids: List[int] = []
+    texts: List[str] = []
+    for record_id, text in items:
+        ids.append(record_id)
+        texts.append(text)
+        if len(ids) >= batch_size:
+            yield ids, texts
+            ids, texts = [], []
+    if ids:
+        yield ids, texts
+
+
+def _id_runs(ids: List[int]) -> List[Tuple[int, int]]:
+    """将有序id列表合并为连续区间 [(start, end), ...]。"""
+    runs: List[Tuple[int, int]] = []
+    for record_id in ids:
+        if runs and record_id == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], record_id)
+        else:
+            runs.append((record_id, record_id))
+    return runs
+
+
+def _skip_archived(archive: Optional[ColdArchive], windows: Iterable[Tuple[int, str]],
+                   chunk_size: int = 1024) -> Iterator[Tuple[int, str]]:
+    """过滤掉已归档记录的窗口，按块批量判断是否已归档。"""
+    if archive is None or not len(archive):
+        yield from windows
+        return
+    chunk: List[Tuple[int, str]] = []
+    for item in windows:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield from (w for w, archived in zip(chunk, archive.contains([i for i, _ in chunk])) if not archived)
+            chunk = []
+    if chunk:
+        yield from (w for w, archived in zip(chunk, archive.contains([i for i, _ in chunk])) if not archived)
+
+
+class _ArchiveWriter:
+    """把 embed_windows_parallel 的 upsert 追加到冷存储，用于更换模型时重新嵌入已归档的记录。"""
+    def __init__(self, archive: ColdArchive):
+        self.archive = archive
+
+    def upsert(self, data: List[List[Any]]):
+        self.archive.append(data[0], data[1])
+
+
+def embed_windows_parallel(client: UserClient, collection: Collection, windows: Iterable[Tuple[int, str]],
+                           batch_size: int = 64, workers: int = 2,
+                           on_batch_done: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    流式嵌入上下文窗口并upsert到集合。主线程按id顺序读取SQL并分批，一个线程按顺序嵌入，workers 个线程并行写入，
+    同时在途的批次不超过 2 * workers，内存占用与总量无关。
+    嵌入后端共享一个模型，HF fast tokenizer 并发调用会报 `Already borrowed`，因此嵌入只在一个线程中进行。
+    Args:
+        windows (Iterable[Tuple[int, str]]): 按id递增的 (记录ID, 上下文窗口文本)，见 UserClient._iter_context_windows。
+        on_batch_done (Optional[Callable[[int, int], None]]): 按id顺序回调 (本批最大id, 本批数量)，
+            回调时该id及之前的所有批次都已写入，可直接作为检查点。
+    Returns:
+        int: 写入的向量数量。
+    """
+    def upsert(ids: List[int], embedding_future: Future) -> Tuple[int, int]:
+        collection.upsert([ids, embedding_future.result()])
+        return ids[-1], len(ids)
+
+    total = 0
+    pending: Deque[Future] = deque()
+
+    def drain(max_in_flight: int):
+        nonlocal total
+        while pending and (pending[0].done() or len(pending) > max_in_flight):
+            last_id, count = pending.popleft().result()
+            total += count
+            if on_batch_done is not None:
+                on_batch_done(last_id, count)
+
+    with ThreadPoolExecutor(max_workers=1) as embedder, ThreadPoolExecutor(max_workers=workers) as writer:
+        try:
+            for ids, texts in _batched(windows, batch_size):
+                embedding_future = embedder.submit(client.embedding_function.get_embedding, texts)
+                pending.append(writer.submit(upsert, ids, embedding_future))
+                drain(2 * workers)
+            drain(0)
+        finally:
+            # 出错时不再等待后续批次的结果，尚未开始的嵌入和写入直接取消，已开始的由线程池收尾
+            embedder.shutdown(cancel_futures=True)
+            for future in pending:
+                future.cancel()
+    return total
+
+
+def diff_raw_vectors(client: UserClient, scan_batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    对比SQL记录与向量：缺失 = SQL中有、热集合和冷存储中都没有；孤儿 = 热集合中有、SQL中没有。
+    Returns:
+        Dict[str, Any]: `sql_rows`, `hot_vectors`, `archived`, `missing`（id列表）, `orphans`（id列表）。
+    """
+    storage = client._connect_sql()
+    collection = client.raw_text_collection
+    archived_ids = set(client.cold_archive._load()[0].tolist()) if client.cold_archive is not None else set()
+
+    def missing_in_collection(batch_ids: List[int]) -> List[int]:
+        rows = collection.query(expr=f"id in {batch_ids}", output_fields=["id"])
+        present = {row["id"] for row in rows}
+        return [i for i in batch_ids if i not in present]
+
+    sql_rows = 0
+    missing: List[int] = []
+    batch: List[int] = []
+    for row in storage.iter_read("SELECT id FROM user_dialogues ORDER BY id ASC;"):
+        sql_rows += 1
+        if row["id"] in archived_ids:
+            continue
+        batch.append(row["id"])
+        if len(batch) >= scan_batch_size:
+            missing.extend(missing_in_collection(batch))
+            batch = []
+    if batch:
+        missing.extend(missing_in_collection(batch))
+
+    hot_vectors = 0
+    orphans: List[int] = []
+    iterator = collection.query_iterator(batch_size=scan_batch_size, expr="id >= 0", output_fields=["id"])
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            hot_vectors += len(rows)
+            batch_ids = [row["id"] for row in rows]
+            placeholders = ",".join("?" * len(batch_ids))
+            found = {r["id"] for r in storage.read(f"SELECT id FROM user_dialogues WHERE id IN ({placeholders});",
+                                                   batch_ids)}
+            orphans.extend(i for i in batch_ids if i not in found)
+    finally:
+        iterator.close()
+
+    return {"sql_rows": sql_rows, "hot_vectors": hot_vectors, "archived": len(archived_ids),
+            "missing": missing, "orphans": sorted(orphans)}
+
+
+def reconcile_user(client: UserClient, repair: bool = False, batch_size: int = 64, workers: int = 2,
+                   scan_batch_size: int = 1000, window_size: int = 5,
+                   checkpoint: Optional[Checkpoint] = None) -> Dict[str, Any]:
+    """
+    对账一个用户，repair 为真时按连续id区间重建缺失窗口的向量并删除孤儿向量。
+    检查点中有已完成的重建时，切换后写入的记录和摘要可能来自仍按旧模型运行的服务，计为 unverified_after_switch
+    和 unverified_summaries_after_switch，repair 时用当前模型重新嵌入。
+    工具的模型与原始记忆或摘要集合记录的模型不一致时标记 model_mismatch 且不做任何修复。
+    Returns:
+        Dict[str, Any]: 对账和修复统计，id列表只保留数量。
+    """
+    start = time.perf_counter()
+    user_id = client.user_id
+    model_tag = client.embedding_function.model_tag
+    collection_tag = raw_text_model_tag(client.raw_text_collection)
+    summary_tag = raw_text_model_tag(client.summary_collection)
+    model_mismatch = bool(model_tag and any(tag and tag != model_tag for tag in (collection_tag, summary_tag)))
+    diff = diff_raw_vectors(client, scan_batch_size)
+    report = {"user_id": user_id, "mode": "reconcile", "model_tag": model_tag,
+              "collection_model_tag": collection_tag, "summary_model_tag": summary_tag,
+              "model_mismatch": model_mismatch,
+              "sql_rows": diff["sql_rows"], "hot_vectors": diff["hot_vectors"], "archived": diff["archived"],
+              "missing": len(diff["missing"]), "orphans": len(diff["orphans"]), "unverified_after_switch": 0,
+              "unverified_summaries_after_switch": 0, "rebuilt": 0, "deleted": 0, "reembedded": 0,
+              "summaries_reembedded": 0}
+
+    entry = checkpoint.get(user_id) if checkpoint is not None else {}
+    verified_id = entry.get("verified_id") if entry.get("mode") == "rebuild" and entry.get("done") else None
+    unverified_end = 0
+    if verified_id is not None:
+        row = client._connect_sql().read_one(
+            "SELECT COUNT(*) AS count, MAX(id) AS max_id FROM user_dialogues WHERE id > ?;", (verified_id,))
+        report["unverified_after_switch"] = row["count"]
+        unverified_end = row["max_id"] or 0
+    summary_verified_id = entry.get("summary_verified_id") if verified_id is not None else None
+    if summary_verified_id is not None:
+        row = client._connect_sql().read_one("SELECT COUNT(*) AS count FROM summary WHERE id > ?;",
+                                             (summary_verified_id,))
+        report["unverified_summaries_after_switch"] = row["count"]
+
+    if model_mismatch:
+        print(f"Warning: user {user_id} collections hold '{collection_tag}' / '{summary_tag}' vectors but this tool "
+              f"embeds with '{model_tag}'; skipping repair, run rebuild to switch models.")
+    elif repair and (diff["missing"] or diff["orphans"] or report["unverified_after_switch"] or
+                     report["unverified_summaries_after_switch"]):
+        collection = client.raw_text_collection
+        missing = set(diff["missing"])
+        windows = (item for run_start, run_end in _id_runs(diff["missing"])
+                   for item in client._iter_context_windows(run_start, run_end, window_size)
+                   if item[0] in missing)
+        report["rebuilt"] = embed_windows_parallel(client, collection, windows, batch_size, workers)
+        for i in range(0, len(diff["orphans"]), scan_batch_size):
+            batch_ids = diff["orphans"][i:i + scan_batch_size]
+            collection.delete(expr=f"id in {batch_ids}")
+            report["deleted"] += len(batch_ids)
+        if report["unverified_after_switch"]:
+            # 切换后写入的向量无法区分由哪个模型生成，全部用当前模型覆盖
+            windows = (item for item in client._iter_context_windows(verified_id + 1, unverified_end, window_size)
+                       if item[0] not in missing)
+            report["reembedded"] = embed_windows_parallel(client, collection, windows, batch_size, workers)
+        collection.flush()
+        if report["unverified_after_switch"]:
+            checkpoint.update(user_id, verified_id=unverified_end)
+        if report["unverified_summaries_after_switch"]:
+            report["summaries_reembedded"], summary_end = embed_summaries(
+                client, client.summary_collection, summary_verified_id, batch_size)
+            client.summary_collection.flush()
+            checkpoint.update(user_id, summary_verified_id=summary_end)
+
+    elapsed = time.perf_counter() - start
+    embedded = report["rebuilt"] + report["reembedded"]
+    report["elapsed_s"] = round(elapsed, 3)
+    report["vectors_per_s"] = round(embedded / elapsed, 1) if elapsed and embedded else 0.0
+    return report
+
+
+def _collection_versions(client: UserClient, alias: str) -> Dict[int, str]:
+    """别名 alias 对应的所有版本化物理集合 {版本号: 集合名}。"""
+    pattern = re.compile(re.escape(alias) + r"_v(\d+)$")
+    versions = {}
+    for name in utility.list_collections(using=client.milvus_alias):
+        match = pattern.match(name)
+        if match:
+            versions[int(match.group(1))] = name
+    return versions
+
+
+def resolve_alias(client: UserClient, alias: str) -> str:
+    """别名当前指向的物理集合名，早期未使用别名的用户返回同名物理集合。"""
+    for _, name in sorted(_collection_versions(client, alias).items(), reverse=True):
+        if alias in utility.list_aliases(name, using=client.milvus_alias):
+            return name
+    return alias
+
+
+def switch_alias(client: UserClient, alias: str, target: str) -> str:
+    """
+    将别名切换到 target，alter_alias 是原子的，已打开的别名集合对象随之指向新集合。
+    早期用户的同名物理集合占用了别名，先改名为 _v1 版本再创建别名，期间短暂不可检索；
+    旧集合保留，创建别名失败时别名重新指向旧集合。
+    Returns:
+        str: 切换前的物理集合名，可用于回滚或 --drop-old。
+    """
+    previous = resolve_alias(client, alias)
+    if previous == alias:
+        legacy = f"{alias}_v1"
+        utility.rename_collection(alias, legacy, using=client.milvus_alias)
+        previous = legacy
+        try:
+            utility.create_alias(target, alias, using=client.milvus_alias)
+        except Exception:
+            utility.create_alias(legacy, alias, using=client.milvus_alias)
+            raise
+    else:
+        utility.alter_alias(target, alias, using=client.milvus_alias)
+    return previous
+
+
+def resolve_raw_text_collection(client: UserClient) -> str:
+    """raw_text_embeddings 别名当前指向的物理集合名，见 resolve_alias。"""
+    return resolve_alias(client, client.raw_text_collection_name)
+
+
+def switch_raw_text_alias(client: UserClient, target: str) -> str:
+    """切换 raw_text_embeddings 别名并重新打开客户端的集合对象，见 switch_alias。"""
+    previous = switch_alias(client, client.raw_text_collection_name, target)
+    client.raw_text_collection = Collection(client.raw_text_collection_name, using=client.milvus_alias)
+    return previous
+
+
+def switch_summary_alias(client: UserClient, target: str) -> str:
+    """切换 summary_collection 别名并重新打开客户端的集合对象，见 switch_alias。"""
+    previous = switch_alias(client, client.summary_collection_name, target)
+    client.summary_collection = Collection(client.summary_collection_name, using=client.milvus_alias)
+    return previous
+
+
+def embed_summaries(client: UserClient, collection: Collection, after_id: int = 0,
+                    batch_size: int = 64) -> Tuple[int, int]:
+    """
+    按id顺序重新嵌入 id > after_id 的摘要并upsert到 collection，摘要数量远少于原始记录，单线程处理。
+    Returns:
+        Tuple[int, int]: (写入的向量数量, 处理到的最大摘要id)。
+    """
+    count, last_id = 0, after_id
+    batch: List[Dict[str, Any]] = []
+
+    def upsert(rows: List[Dict[str, Any]]):
+        embeddings = client.embedding_function.get_embedding([row["summary_text"] for row in rows])
+        collection.upsert([[row["id"] for row in rows], embeddings, [row["start_time"] for row in rows],
+                           [row["end_time"] for row in rows], [row["summary_text"] for row in rows]])
+
+    query = "SELECT id, start_time, end_time, summary_text FROM summary WHERE id > ? ORDER BY id ASC;"
+    for row in client._connect_sql().iter_read(query, (after_id,)):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            upsert(batch)
+            count, last_id, batch = count + len(batch), batch[-1]["id"], []
+    if batch:
+        upsert(batch)
+        count, last_id = count + len(batch), batch[-1]["id"]
+    return count, last_id
+
+
+def rebuild_user(client: UserClient, checkpoint: Checkpoint, batch_size: int = 64, workers: int = 2,
+                 window_size: int = 5, drop_old: bool = False, model_change: bool = False) -> Dict[str, Any]:
+    """
+    全量重新嵌入一个用户的原始记忆和摘要到新版本集合，两个别名在同一步切换，可从检查点继续。
+    已归档的记录不进入热集合：模型不变时冷存储原样保留；更换模型（或集合未记录模型）时，
+    已归档的记录用新模型嵌入到新的冷存储文件，切换时替换旧冷存储，旧文件改名备份。
+    当前集合记录的模型与本次不同时需要 model_change 为真：切换后仍按旧模型运行的服务会向新集合写入旧模型向量，
+    调用方负责在切换时以新模型重启服务，之后由 reconcile_user 按检查点中的 verified_id /
+    summary_verified_id 重新嵌入切换后的记录和摘要。
+    Returns:
+        Dict[str, Any]: 重建统计。
+    """
+    start = time.perf_counter()
+    user_id = client.user_id
+    model_tag = client.embedding_function.model_tag
+    active_tag = raw_text_model_tag(client.raw_text_collection)
+    if active_tag and model_tag and active_tag != model_tag and not model_change:
+        raise RuntimeError(
+            f"User {user_id}: the active collection holds '{active_tag}' vectors and this rebuild embeds with "
+            f"'{model_tag}'. Services still running '{active_tag}' would keep writing its vectors into the new "
+            f"collection after the switch; restart them with the new embedding backend at the switch and pass "
+            f"--model-change.")
+    entry = checkpoint.get(user_id)
+    # 检查点中的目标集合由其他模型生成时不能继续，重新建一个版本
+    if entry.get("mode") == "rebuild" and not entry.get("done") and \
+            entry.get("model_tag", model_tag) == model_tag and \
+            utility.has_collection(entry["target"], using=client.milvus_alias):
+        target, last_id, vectors = entry["target"], entry["last_id"], entry["vectors"]
+        collection = Collection(target, using=client.milvus_alias)
+        print(f"Resuming rebuild of user {user_id} into '{target}' after id {last_id}.")
+    else:
+        version = max(_collection_versions(client, client.raw_text_collection_name), default=1) + 1
+        target, last_id, vectors = client.versioned_raw_text_collection_name(version), 0, 0
+        collection = client._create_raw_text_collection(target)
+        checkpoint.update(user_id, mode="rebuild", target=target, model_tag=model_tag, last_id=0, vectors=0,
+                          done=False)
+        print(f"Rebuilding user {user_id} into '{target}'.")
+
+    def on_batch_done(batch_last_id: int, count: int):
+        nonlocal last_id, vectors
+        last_id, vectors = batch_last_id, vectors + count
+        checkpoint.update(user_id, last_id=last_id, vectors=vectors)
+
+    archive = client.cold_archive
+
+    def catch_up() -> int:
+        """流式处理到当前表尾，期间新插入的记录也会在下一轮被处理。"""
+        nonlocal last_id
+        embedded = 0
+        storage = client._connect_sql()
+        while True:
+            max_id = storage.read_one("SELECT MAX(id) AS max_id FROM user_dialogues;")["max_id"] or 0
+            if max_id <= last_id:
+                return embedded
+            windows = _skip_archived(archive, client._iter_context_windows(last_id + 1, max_id, window_size))
+            embedded += embed_windows_parallel(client, collection, windows, batch_size, workers, on_batch_done)
+            # 区间末尾的记录可能都已归档、没有触发 on_batch_done
+            last_id = max_id
+            checkpoint.update(user_id, last_id=last_id)
+
+    embedded = catch_up()
+    collection.flush()
+    collection.load()
+
+    # 更换模型时已归档的记录用新模型重新嵌入到暂存的冷存储，每次都从头生成
+    staged_archive: Optional[ColdArchive] = None
+    archive_vectors = 0
+    if archive is not None and len(archive) and not (active_tag and active_tag == model_tag):
+        staged_archive = ColdArchive(f"{archive.path_prefix}.{target}", archive.dim)
+        for path in (staged_archive.ids_path, staged_archive.vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        archived_ids = np.unique(archive._load()[0]).tolist()
+        windows = (item for run_start, run_end in _id_runs(archived_ids)
+                   for item in client._iter_context_windows(run_start, run_end, window_size))
+        archive_vectors = embed_windows_parallel(client, _ArchiveWriter(staged_archive), windows, batch_size, workers)
+
+    # 摘要很少，每次（包括从检查点继续时）都全量嵌入到检查点记录的摘要目标集合
+    summary_target = entry.get("summary_target") if entry.get("target") == target else None
+    if summary_target and utility.has_collection(summary_target, using=client.milvus_alias):
+        summary_collection = Collection(summary_target, using=client.milvus_alias)
+    else:
+        version = max(_collection_versions(client, client.summary_collection_name), default=1) + 1
+        summary_target = client.versioned_summary_collection_name(version)
+        summary_collection = client._create_summary_collection(summary_target)
+        checkpoint.update(user_id, summary_target=summary_target)
+    summaries, summary_last_id = embed_summaries(client, summary_collection, 0, batch_size)
+    summary_collection.flush()
+    summary_collection.load()
+
+    previous = switch_raw_text_alias(client, target)
+    previous_summary = switch_summary_alias(client, summary_target)
+    # 追平检查到切换之间新写入旧集合的记录和摘要
+    embedded += catch_up()
+    collection.flush()
+    added, summary_last_id = embed_summaries(client, summary_collection, summary_last_id, batch_size)
+    summaries += added
+    summary_collection.flush()
+
+    if staged_archive is not None:
+        archive.retire(f"before_{target}", replacement=staged_archive)
+    if drop_old:
+        utility.drop_collection(previous, using=client.milvus_alias)
+        utility.drop_collection(previous_summary, using=client.milvus_alias)
+    # verified_id 之后的记录和 summary_verified_id 之后的摘要可能由尚未重启的旧模型服务写入，由 reconcile --repair 重新嵌入
+    checkpoint.update(user_id, done=True, verified_id=last_id, summary_verified_id=summary_last_id)
+    if active_tag != model_tag:
+        print(f"Warning: user {user_id} switched to '{target}' embedded with '{model_tag}'. Restart every memory "
+              f"service with this embedding backend now, then run 'reindex.py reconcile --repair' to re-embed "
+              f"records written after id {last_id} and summaries after id {summary_last_id}.")
+
+    elapsed = time.perf_counter() - start
+    return {"user_id": user_id, "mode": "rebuild", "target": target, "previous": previous,
+            "summary_target": summary_target, "previous_summary": previous_summary,
+            "embedded": embedded, "total_vectors": vectors, "summaries": summaries,
+            "archive_reembedded": archive_vectors, "elapsed_s": round(elapsed, 3),
+            "vectors_per_s": round(embedded / elapsed, 1) if elapsed and embedded else 0.0}
+
+
+def discover_users(data_dir: str) -> List[str]:
+    """从数据目录下的 user_data_<user_id>.db 文件找出所有用户。"""
+    paths = glob.glob(os.path.join(data_dir, "user_data_*.db"))
+    return sorted(os.path.basename(p)[len("user_data_"):-len(".db")] for p in paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="原始记忆向量对账与全量重建")
+    parser.add_argument("mode", choices=["reconcile", "rebuild"])
+    parser.add_argument("--config", default=None, help="JSON配置文件路径，提供Milvus地址和嵌入后端")
+    parser.add_argument("--data-dir", default=".", help="user_data_<user_id>.db 所在目录")
+    parser.add_argument("--user", action="append", default=[], help="用户id，可重复；与 --all 二选一")
+    parser.add_argument("--all", action="store_true", help="处理数据目录下的所有用户")
+    parser.add_argument("--repair", action="store_true", help="reconcile 模式下重建缺失向量并删除孤儿向量")
+    parser.add_argument("--batch-size", type=int, default=64, help="每批嵌入的窗口数量")
+    parser.add_argument("--workers", type=int, default=2, help="并行写入Milvus的线程数，嵌入固定在一个线程中")
+    parser.add_argument("--window-size", type=int, default=5)
+    parser.add_argument("--checkpoint", default="reindex_checkpoint.json",
+                        help="rebuild 的检查点文件，reconcile 据此复查切换后写入的记录")
+    parser.add_argument("--drop-old", action="store_true", help="rebuild 切换后删除旧版本集合")
+    parser.add_argument("--model-change", action="store_true",
+                        help="允许 rebuild 更换嵌入模型；切换时必须以新模型重启所有服务")
+    parser.add_argument("--output", default=None, help="报告输出的JSON文件路径")
+    args = parser.parse_args()
+
+    user_ids = discover_users(args.data_dir) if args.all else args.user
+    if not user_ids:
+        parser.error("no users given, use --user or --all")
+
+    memory_config = load_config(args.config)["memory"]
+    backend = create_embedding_backend(memory_config["embedding_backend"], **memory_config["embedding_options"])
+    embedding_function = MilvusEmbeddingFunction(
+        backend=backend, batch_size=memory_config["embedding_batch_size"],
+        model_tag=embedding_model_tag(memory_config["embedding_backend"], memory_config["embedding_options"]))
+    checkpoint = Checkpoint(args.checkpoint)
+
+    reports = []
+    for user_id in user_ids:
+        client = UserClient(user_id, embedding_function,
+                            sql_db_path=os.path.join(args.data_dir, f"user_data_{user_id}.db"),
+                            milvus_host=memory_config["milvus_host"], milvus_port=memory_config["milvus_port"])
+        try:
+            client._create_user_databases()
+            if args.mode == "reconcile":
+                reports.append(reconcile_user(client, args.repair, args.batch_size, args.workers,
+                                              window_size=args.window_size, checkpoint=checkpoint))
+            else:
+                reports.append(rebuild_user(client, checkpoint, args.batch_size, args.workers,
+                                            args.window_size, args.drop_old, args.model_change))
+        finally:
+            client.close()
+        print(json.dumps(reports[-1], ensure_ascii=False))
+
+    elapsed = sum(r["elapsed_s"] for r in reports)
+    vectors = sum(r.get("embedded", r.get("rebuilt", 0) + r.get("reembedded", 0)) for r in reports)
+    summary = {"mode": args.mode, "users": reports, "elapsed_s": round(elapsed, 3),
+               "vectors": vectors, "vectors_per_s": round(vectors / elapsed, 1) if elapsed else 0.0}
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
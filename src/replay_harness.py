@@ -0,0 +1,243 @@
+
+# =========================================================================
+# 端到端对话延迟回放 (Turn-Latency Replay Harness)
+# -------------------------------------------------------------------------
+# 用录制好的对话回放完整的一轮处理流程（检索 -> 生成 -> 解析 -> 动作分发 -> 写回记忆），
+# 测量用户能感知到的延迟，便于在改动上线前对比：
+#   time_to_first_motion   本轮开始到本地VTS模拟服务器收到第一个 HotkeyTriggerRequest
+#   time_to_first_speech   本轮开始到第一段非空纯文本交给 on_speech
+#   full_turn              本轮开始到记忆写回完成
+# VTube Studio 由本地websocket模拟服务器代替，基础模型由按脚本流式输出的桩代替，
+# 记忆模块默认关闭（--memory 开启时需要可用的Milvus）。
+# 纯文本片段按语速合成振幅包络驱动口型参数流，报告中包含参数流的实际帧率、抖动和丢帧数，以及动作队列的指标。
+#   python replay_harness.py conversation.jsonl [--memory] [--output report.json] [--baseline old.json]
+# 录制文件每行一个JSON：{"user_id": "...", "user": "用户输入", "assistant": "带<motion>标签的回复"}
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config import load_config
+from core import CoreModule
+from output_parser import MOTION_PATTERN
+
+METRICS = ["time_to_first_motion", "time_to_first_speech", "full_turn"]
+
+
+class FakeVTSServer:
+    """
+    本地VTube Studio模拟服务器，实现pyvts用到的请求，记录每个热键触发的到达时间。
+    """
+    def __init__(self, hotkeys: List[str], host: str = "127.0.0.1", port: int = 0, response_delay: float = 0.0):
+        self.hotkeys = list(hotkeys)
+        self.host = host
+        self.port = port
+        self.response_delay = response_delay
+        self.hotkey_triggers: List[Tuple[float, str]] = []
+        self.parameter_injections: List[Tuple[float, List[Dict[str, Any]]]] = []
+        self._server = None
+
+    async def start(self):
+        import websockets
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, websocket, path=None):
+        from websockets.exceptions import ConnectionClosed
+        try:
+            async for message in websocket:
+                received = time.perf_counter()
+                request = json.loads(message)
+                response = self._respond(request, received)
+                if self.response_delay:
+                    # 延迟在后台回复，不阻塞读取后续请求，与真实VTS一样请求到达时间不受回复延迟影响
+                    asyncio.create_task(self._reply_later(websocket, response))
+                else:
+                    await websocket.send(json.dumps(response))
+        except ConnectionClosed:
+            pass # 客户端超时后重建连接，迟到的回复无处可发
+
+    async def _reply_later(self, websocket, response: Dict[str, Any]):
+        from websockets.exceptions import ConnectionClosed
+        await asyncio.sleep(self.response_delay)
+        try:
+            await websocket.send(json.dumps(response))
+        except ConnectionClosed:
+            pass
+
+    def _respond(self, request: Dict[str, Any], received: float) -> Dict[str, Any]:
+        message_type = request.get("messageType")
+        data = request.get("data") or {}
+        if message_type == "AuthenticationTokenRequest":
+            response_type, response_data = "AuthenticationTokenResponse", {"authenticationToken": "replay-token"}
+        elif message_type == "AuthenticationRequest":
+            response_type, response_data = "AuthenticationResponse", {"authenticated": True, "reason": ""}
+        elif message_type == "HotkeysInCurrentModelRequest":
+            response_type = "HotkeysInCurrentModelResponse"
+            response_data = {"modelLoaded": True, "availableHotkeys": [
+                {"name": name, "type": "TriggerAnimation", "hotkeyID": name} for name in self.hotkeys]}
+        elif message_type == "HotkeyTriggerRequest" and data.get("hotkeyID") in self.hotkeys:
+            self.hotkey_triggers.append((received, data["hotkeyID"]))
+            response_type, response_data = "HotkeyTriggerResponse", {"hotkeyID": data["hotkeyID"]}
+        elif message_type == "InjectParameterDataRequest":
+            self.parameter_injections.append((received, data.get("parameterValues", [])))
+            response_type, response_data = "InjectParameterDataResponse", {}
+        else:
+            response_type = "APIError"
+            response_data = {"errorID": 50, "message": f"Unsupported request in replay: {message_type}"}
+        return {"apiName": "VTubeStudioPublicAPI", "apiVersion": "1.0", "timestamp": int(time.time() * 1000),
+                "requestID": request.get("requestID", ""), "messageType": response_type, "data": response_data}
+
+
+class ScriptedLLM:
+    """
+    按脚本流式输出的基础模型桩：等待 first_token_latency 后输出第一个片段，之后每 token_interval 输出一个片段。
+    """
+    def __init__(self, first_token_latency: float = 0.3, token_interval: float = 0.03, chars_per_token: int = 2):
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.chars_per_token = chars_per_token
+        self.script = ""
+
+    async def __call__(self, prompt: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_latency)
+        for i in range(0, len(self.script), self.chars_per_token):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield self.script[i:i + self.chars_per_token]
+
+
+def speech_envelope(text: str, chars_per_second: float = 8.0, rate: float = 60.0) -> List[float]:
+    """按语速为文本合成口型包络，每个字一个开合，代替TTS音频的振幅包络。"""
+    points_per_char = max(2, int(rate / chars_per_second))
+    shape = [math.sin(math.pi * i / points_per_char) for i in range(points_per_char)]
+    return [v for ch in text if not ch.isspace() for v in shape]
+
+
+def load_conversation(path: str) -> List[Dict[str, str]]:
+    turns = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                turns.append(json.loads(line))
+    return turns
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """延迟分布，单位毫秒，百分位按最近秩计算。"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    percentile = lambda p: ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+    to_ms = lambda v: round(v * 1000, 2)
+    return {"count": len(ordered), "mean": to_ms(sum(ordered) / len(ordered)), "p50": to_ms(percentile(50)),
+            "p90": to_ms(percentile(90)), "p99": to_ms(percentile(99)), "max": to_ms(ordered[-1])}
+
+
+async def replay(turns: List[Dict[str, str]], llm: ScriptedLLM, config: Dict[str, Any],
+                 vts_response_delay: float = 0.0) -> Dict[str, Any]:
+    """
+    回放对话并返回延迟报告。config 中avatar段的地址会被替换为本地模拟服务器。
+    """
+    hotkeys = sorted({m.strip() for turn in turns for m in MOTION_PATTERN.findall(turn["assistant"])})
+    server = FakeVTSServer(hotkeys, response_delay=vts_response_delay)
+    await server.start()
+
+    samples: Dict[str, List[float]] = {name: [] for name in METRICS}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config["avatar"].update(vts_host=server.host, vts_port=server.port,
+                                token_path=os.path.join(tmp_dir, "pyvts_token.txt"))
+        core = CoreModule(config)
+        parameter_stats: Dict[str, Any] = {}
+        motion_queue_stats: Dict[str, Any] = {}
+        try:
+            await core._setup()
+            avatar = core.avatar_module
+
+            async def on_speech(text: str):
+                avatar.mouth.extend(speech_envelope(text, rate=avatar.parameter_stream.fps),
+                                    avatar.parameter_stream.fps)
+
+            for turn in turns:
+                llm.script = turn["assistant"]
+                triggers_before = len(server.hotkey_triggers)
+                start = time.perf_counter()
+                result = await core.handle_turn(turn.get("user_id", "replay"), turn["user"], llm, on_speech)
+                # 动作在avatar模块的队列中异步发送，等队列清空后再读取服务器记录的到达时间
+                await avatar.join()
+                if len(server.hotkey_triggers) > triggers_before:
+                    samples["time_to_first_motion"].append(server.hotkey_triggers[triggers_before][0] - start)
+                if result["timings"]["first_speech"] is not None:
+                    samples["time_to_first_speech"].append(result["timings"]["first_speech"])
+                samples["full_turn"].append(result["timings"]["full_turn"])
+            parameter_stats = avatar.parameter_stream.stats()
+            parameter_stats["frames_received"] = len(server.parameter_injections)
+            motion_queue_stats = avatar.queue_metrics()
+        finally:
+            await core.shutdown()
+            await server.stop()
+
+    return {
+        "turns": len(turns),
+        "memory": core.memory_module is not None,
+        "llm": {"first_token_latency": llm.first_token_latency, "token_interval": llm.token_interval,
+                "chars_per_token": llm.chars_per_token},
+        "vts_response_delay": vts_response_delay,
+        "latency_ms": {name: summarize(values) for name, values in samples.items()},
+        "parameter_stream": parameter_stats,
+        "motion_queue": motion_queue_stats,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """与基线报告对比，返回各指标 p50/p90/p99 的变化（毫秒，正数表示变慢）。"""
+    deltas = {}
+    for name in METRICS:
+        current, previous = report["latency_ms"].get(name, {}), baseline["latency_ms"].get(name, {})
+        deltas[name] = {p: round(current[p] - previous[p], 2) for p in ("p50", "p90", "p99")
+                        if p in current and p in previous}
+    return deltas
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="回放录制的对话并报告每轮延迟分布")
+    parser.add_argument("conversation", help="JSONL录制文件，每行包含 user_id/user/assistant")
+    parser.add_argument("--config", default=None, help="JSON配置文件路径")
+    parser.add_argument("--memory", action="store_true", help="开启记忆模块（需要可用的Milvus）")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="基础模型首个片段的延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.03, help="基础模型片段间隔（秒）")
+    parser.add_argument("--chars-per-token", type=int, default=2, help="每个片段的字符数")
+    parser.add_argument("--vts-delay", type=float, default=0.0, help="模拟VTS响应延迟（秒）")
+    parser.add_argument("--output", default=None, help="报告输出的JSON文件路径")
+    parser.add_argument("--baseline", default=None, help="用于对比的基线报告")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    config["memory"]["enabled"] = args.memory
+    llm = ScriptedLLM(args.first_token_latency, args.token_interval, args.chars_per_token)
+    report = asyncio.run(replay(load_conversation(args.conversation), llm, config, args.vts_delay))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["delta_vs_baseline_ms"] = compare(report, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
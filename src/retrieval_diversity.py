@@ -0,0 +1,64 @@
+
+# =========================================================================
+# 检索结果多样化 (Retrieval Diversification)
+# -------------------------------------------------------------------------
+# 每条原始记忆向量是以该记录结尾的5条消息滑动窗口的嵌入，相邻id的窗口大部分文本相同，
+# 因此一次查询的top_k常常是同一时刻的几条相邻记录。
+# 这里提供两个检索后处理步骤：
+#   mmr_select       MMR式选择，相关度减去与已选结果的窗口重叠度，diversity 控制两者权衡
+#   collapse_windows 将窗口有重叠的命中合并为一个id区间（span），区间可用一次SQL查询取回原文
+# 窗口重叠度只依赖id，不需要取回向量。
+
+from typing import Any, Dict, List
+
+
+def window_overlap(id_a: int, id_b: int, window_size: int = 5) -> float:
+    """两条记录的上下文窗口重叠比例，相同为1，相距 window_size 及以上为0。"""
+    return max(0, window_size - abs(id_a - id_b)) / window_size
+
+
+def mmr_select(hits: List[Dict[str, Any]], top_k: int, diversity: float = 0.3,
+               window_size: int = 5) -> List[Dict[str, Any]]:
+    """
+    MMR式选择：每一步选 (1 - diversity) * 相关度 - diversity * 与已选结果的最大窗口重叠度 最大的命中。
+    Args:
+        hits (List[Dict[str, Any]]): 候选命中，包含 `id` 和 `distance`（COSINE相似度，越大越相关）。
+        top_k (int): 选出的数量。
+        diversity (float): 0 表示只看相关度，1 表示只看多样性。
+        window_size (int): 滑动窗口大小。
+    Returns:
+        List[Dict[str, Any]]: 按选择顺序排列的命中。
+    """
+    candidates = list(hits)
+    selected: List[Dict[str, Any]] = []
+    while candidates and len(selected) < top_k:
+        def mmr_score(hit):
+            redundancy = max((window_overlap(hit["id"], s["id"], window_size) for s in selected), default=0.0)
+            return (1 - diversity) * hit["distance"] - diversity * redundancy
+        best = max(candidates, key=mmr_score)
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+
+def collapse_windows(hits: List[Dict[str, Any]], window_size: int = 5) -> List[Dict[str, Any]]:
+    """
+    将窗口有重叠的命中合并为id区间。记录 id 的窗口覆盖 [id - window_size + 1, id]。
+    Returns:
+        List[Dict[str, Any]]: span 列表，按相关度从高到低排列，每个 span 包含
+            `start_id`, `end_id`, `hit_ids`, `id`（区间内最相关的命中id）, `distance`（区间内最高相关度）。
+    """
+    spans: List[Dict[str, Any]] = []
+    for hit in sorted(hits, key=lambda h: h["id"]):
+        start_id = max(1, hit["id"] - window_size + 1)
+        if spans and start_id <= spans[-1]["end_id"]:
+            span = spans[-1]
+            span["end_id"] = max(span["end_id"], hit["id"])
+            span["hit_ids"].append(hit["id"])
+            if hit["distance"] > span["distance"]:
+                span["id"], span["distance"] = hit["id"], hit["distance"]
+        else:
+            spans.append({"start_id": start_id, "end_id": hit["id"], "hit_ids": [hit["id"]],
+                          "id": hit["id"], "distance": hit["distance"]})
+    spans.sort(key=lambda s: s["distance"], reverse=True)
+    return spans
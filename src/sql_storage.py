@@ -0,0 +1,352 @@
+
+# =========================================================================
+# SQLite 存储引擎
+# -------------------------------------------------------------------------
+# - 数据库以WAL模式打开，读写互不阻塞
+# - 所有写操作交给单独的写线程串行执行，写线程把队列中已积压的写操作合并为一个事务提交（group commit）
+# - 读操作使用一个小型只读连接池，可在任意线程（包括异步包装使用的线程池）中并发执行
+# - 每个连接都开启较大的语句缓存，相同SQL文本的预编译语句会被复用，调用方应使用固定的SQL字符串
+
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+# 写连接的PRAGMA，WAL + synchronous=NORMAL 在掉电时最多丢失最后若干个事务，但不会损坏数据库
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,        # 约16MB页缓存
+    "mmap_size": 268435456,      # 256MB内存映射
+    "wal_autocheckpoint": 1000,
+    "busy_timeout": 5000,
+}
+
+READER_PRAGMAS = {
+    "query_only": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -8000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+}
+
+_STOP = object()
+
+
+class SQLiteStorage:
+    """
+    单写线程 + 只读连接池的SQLite存储。
+    写操作返回 concurrent.futures.Future，可 .result() 同步等待，也可 asyncio.wrap_future 异步等待。
+    """
+    def __init__(self, db_path: str, read_pool_size: int = 4, max_group_size: int = 256,
+                 group_commit_wait: float = 0.0, cached_statements: int = 256,
+                 writer_pragmas: Optional[Dict[str, Any]] = None,
+                 reader_pragmas: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path (str): 数据库文件路径。
+            read_pool_size (int): 只读连接池大小。
+            max_group_size (int): 单次group commit最多合并的写操作数量。
+            group_commit_wait (float): 取到第一个写操作后额外等待更多写操作的秒数，0表示只合并已积压的写操作。
+            cached_statements (int): 每个连接缓存的预编译语句数量。
+        """
+        self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self.max_group_size = max_group_size
+        self.group_commit_wait = group_commit_wait
+        self.cached_statements = cached_statements
+        self.writer_pragmas = dict(WRITER_PRAGMAS, **(writer_pragmas or {}))
+        self.reader_pragmas = dict(READER_PRAGMAS, **(reader_pragmas or {}))
+
+        self._write_queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_ready = threading.Event()
+        self._writer_error: Optional[BaseException] = None
+
+        self._reader_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._submit_lock = threading.Lock() # 保证写线程异常退出后不会再有写操作进入队列
+        self._closed = False
+
+        # 统计信息
+        self.commit_count = 0
+        self.write_count = 0
+
+    # ---------------------------------------------------------------------
+    # 连接管理
+    # ---------------------------------------------------------------------
+    @staticmethod
+    def _apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, Any]):
+        for key, value in pragmas.items():
+            conn.execute(f"PRAGMA {key}={value};")
+
+    def start(self) -> "SQLiteStorage":
+        """启动写线程，重复调用无副作用。"""
+        if self._writer_thread is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            self._writer_thread = threading.Thread(target=self._writer_loop, name=f"sqlite-writer-{self.db_path}",
+                                                   daemon=True)
+            self._writer_thread.start()
+            self._writer_ready.wait()
+            if self._writer_error:
+                raise self._writer_error
+        return self
+
+    def _open_reader(self) -> sqlite3.Connection:
+        uri = pathlib.Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn, self.reader_pragmas)
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出一个只读连接，池未满时按需创建。"""
+        try:
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._readers_lock:
+                if len(self._readers) < self.read_pool_size:
+                    conn = self._open_reader()
+                    self._readers.append(conn)
+            if conn is None:
+                conn = self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put(conn)
+
+    def close(self):
+        """等待已提交的写操作完成，然后关闭所有连接。写线程异常退出后仍需调用以关闭只读连接。"""
+        with self._submit_lock:
+            self._closed = True
+        if self._writer_thread is not None:
+            self._write_queue.put(_STOP)
+            self._writer_thread.join()
+            self._writer_thread = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+
+    # ---------------------------------------------------------------------
+    # 写线程
+    # ---------------------------------------------------------------------
+    def _writer_loop(self):
+        try:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, cached_statements=self.cached_statements)
+            conn.row_factory = sqlite3.Row
+            self._apply_pragmas(conn, self.writer_pragmas)
+        except BaseException as e:
+            self._writer_error = e
+            self._writer_ready.set()
+            return
+        self._writer_ready.set()
+
+        stopping = False
+        group: List[Any] = []
+        try:
+            while not stopping:
+                group = [self._write_queue.get()]
+                deadline = time.monotonic() + self.group_commit_wait
+                while len(group) < self.max_group_size:
+                    try:
+                        timeout = deadline - time.monotonic()
+                        group.append(self._write_queue.get(timeout=timeout) if timeout > 0
+                                     else self._write_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if _STOP in group:
+                    stopping = True
+                    group = [op for op in group if op is not _STOP]
+                self._run_group(conn, group)
+        except BaseException as e:
+            # 写线程异常退出：存储标记为关闭，当前组和队列中所有未完成的写操作都以该异常失败，调用方不会永久阻塞
+            self._writer_error = e
+            with self._submit_lock:
+                self._closed = True
+            pending = [op for op in group if op is not _STOP]
+            while True:
+                try:
+                    pending.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for op in pending:
+                if op is not _STOP and not op[-1].done():
+                    op[-1].set_exception(RuntimeError(f"SQLiteStorage {self.db_path} writer stopped: {e!r}"))
+            print(f"Error: SQLite writer thread for {self.db_path} stopped: {e!r}")
+        finally:
+            conn.close()
+
+    def _run_group(self, conn: sqlite3.Connection, group: List[Any]):
+        """
+        执行一组写操作。普通语句合并为一个事务，每条语句用SAVEPOINT隔离，单条失败不影响同组其他语句；
+        run_in_writer 提交的函数单独占用一个事务。
+        """
+        statements = []
+        for op in group:
+            if op[0] == "fn":
+                self._run_statements(conn, statements)
+                statements = []
+                self._run_fn(conn, op)
+            else:
+                statements.append(op)
+        self._run_statements(conn, statements)
+
+    def _run_statements(self, conn: sqlite3.Connection, statements: List[Any]):
+        if not statements:
+            return
+        results = []
+        try:
+            conn.execute("BEGIN;")
+            for kind, sql, params, future in statements:
+                conn.execute("SAVEPOINT op;")
+                try:
+                    if kind == "many":
+                        cursor = conn.executemany(sql, params)
+                        results.append((future, cursor.rowcount, None))
+                    else:
+                        cursor = conn.execute(sql, params)
+                        results.append((future, cursor.lastrowid, None))
+                    conn.execute("RELEASE op;")
+                except Exception as e:
+                    # 参数绑定等非sqlite3异常（如整数溢出）同样只让这一条语句失败
+                    conn.execute("ROLLBACK TO op;")
+                    conn.execute("RELEASE op;")
+                    results.append((future, None, e))
+            conn.execute("COMMIT;")
+            self.commit_count += 1
+            self.write_count += len(statements)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            for _, _, _, future in statements:
+                future.set_exception(e)
+            return
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def _run_fn(self, conn: sqlite3.Connection, op: Any):
+        _, fn, future = op
+        try:
+            conn.execute("BEGIN;")
+            value = fn(conn)
+            conn.execute("COMMIT;")
+            self.commit_count += 1
+            self.write_count += 1
+            future.set_result(value)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            future.set_exception(e)
+
+    def _submit(self, op: Any) -> Future:
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError(f"SQLiteStorage {self.db_path} is closed.")
+            self._write_queue.put(op)
+        return op[-1]
+
+    # ---------------------------------------------------------------------
+    # 对外接口
+    # ---------------------------------------------------------------------
+    def write(self, sql: str, params: Sequence[Any] = ()) -> Future:
+        """提交一条写语句，Future结果为 lastrowid。"""
+        return self._submit(("one", sql, params, Future()))
+
+    def write_many(self, sql: str, seq_of_params: Sequence[Sequence[Any]]) -> Future:
+        """提交一条 executemany 写语句，Future结果为 rowcount。"""
+        return self._submit(("many", sql, seq_of_params, Future()))
+
+    def run_in_writer(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        在写线程中以单独事务执行 fn(conn)，适用于批量导入等需要在一个事务中完成多步写入的场景。
+        fn 抛出异常时事务回滚，Future结果为 fn 的返回值。
+        """
+        return self._submit(("fn", fn, Future()))
+
+    def read(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """在只读连接上执行查询，返回字典列表。"""
+        with self._reader() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def read_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        """在只读连接上执行查询，返回第一行或None。"""
+        with self._reader() as conn:
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row else None
+
+    def iter_read(self, sql: str, params: Sequence[Any] = (), batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """流式读取查询结果，迭代期间占用一个只读连接。"""
+        with self._reader() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+
+
+# =========================================================================
+# 插入吞吐基准：python sql_storage.py [插入数量] [并发线程数]
+# -------------------------------------------------------------------------
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    schema = "CREATE TABLE user_dialogues (id INTEGER PRIMARY KEY AUTOINCREMENT, time INTEGER NOT NULL, " \
+             "role TEXT NOT NULL, text TEXT NOT NULL);"
+    insert_sql = "INSERT INTO user_dialogues (time, role, text) VALUES (?, ?, ?);"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 旧方式：默认回滚日志模式，每条INSERT单独commit，共享连接加锁
+        legacy_conn = sqlite3.connect(os.path.join(tmp, "legacy.db"), check_same_thread=False)
+        legacy_conn.execute(schema)
+        lock = threading.Lock()
+
+        def legacy_insert(i):
+            with lock:
+                legacy_conn.execute(insert_sql, (int(time.time()), "user", f"message {i}"))
+                legacy_conn.commit()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(legacy_insert, range(n)))
+        legacy_elapsed = time.perf_counter() - start
+        legacy_conn.close()
+
+        storage = SQLiteStorage(os.path.join(tmp, "wal.db")).start()
+        storage.run_in_writer(lambda conn: conn.execute(schema)).result()
+
+        def storage_insert(i):
+            storage.write(insert_sql, (int(time.time()), "user", f"message {i}")).result()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(storage_insert, range(n)))
+        storage_elapsed = time.perf_counter() - start
+        reads = storage.read("SELECT COUNT(*) AS c FROM user_dialogues;")[0]["c"]
+        commits = storage.commit_count
+        storage.close()
+
+    print(f"legacy (rollback journal, commit per insert): {n / legacy_elapsed:.0f} inserts/s")
+    print(f"SQLiteStorage (WAL, group commit):           {n / storage_elapsed:.0f} inserts/s "
+          f"({reads} rows, {commits} commits)")
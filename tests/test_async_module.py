@@ -0,0 +1,138 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from ABCs import AsyncModule
+
+
+class RecordingModule(AsyncModule):
+    """记录处理过的任务，任务是数字时按该秒数sleep。"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.processed = []
+
+    async def _setup(self):
+        self._is_ready.set()
+
+    async def _process_task(self, task):
+        if isinstance(task, (int, float)):
+            await asyncio.sleep(task)
+        self.processed.append(task)
+
+    async def shutdown(self):
+        await self.shutdown_workers()
+
+
+def test_blocked_producer_is_rejected_after_shutdown():
+    async def scenario():
+        module = RecordingModule(max_queue_size=1, queue_policy="block", num_workers=0)
+        assert await module.enqueue_task("first")
+        producer = asyncio.create_task(module.enqueue_task("second"))
+        await asyncio.sleep(0)
+        await module.shutdown_workers()
+        accepted = await producer
+        return accepted, module.queue_metrics()
+
+    accepted, metrics = asyncio.run(scenario())
+    assert accepted is False
+    assert metrics["depth"] == 0
+    assert metrics["enqueued"] == 1
+    assert metrics["dropped"] == 2
+
+
+def test_drop_new_rejects_when_full():
+    async def scenario():
+        module = RecordingModule(max_queue_size=2, queue_policy="drop_new")
+        results = [await module.enqueue_task(name) for name in "abc"]
+        module.start_workers()
+        await module.join()
+        await module.shutdown()
+        return results, module.processed, module.queue_metrics()
+
+    results, processed, metrics = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert processed == ["a", "b"]
+    assert metrics["dropped"] == 1
+
+
+def test_drop_oldest_keeps_newest():
+    async def scenario():
+        module = RecordingModule(max_queue_size=2, queue_policy="drop_oldest")
+        results = [await module.enqueue_task(name) for name in "abc"]
+        module.start_workers()
+        await module.join()
+        await module.shutdown()
+        return results, module.processed, module.queue_metrics()
+
+    results, processed, metrics = asyncio.run(scenario())
+    assert results == [True, True, True]
+    assert processed == ["b", "c"]
+    assert metrics["dropped"] == 1
+
+
+def test_block_waits_for_a_free_slot():
+    async def scenario():
+        module = RecordingModule(max_queue_size=1, queue_policy="block")
+        await module.enqueue_task("a")
+        producer = asyncio.create_task(module.enqueue_task("b"))
+        await asyncio.sleep(0.01)
+        blocked = not producer.done()
+        module.start_workers()
+        accepted = await producer
+        await module.join()
+        await module.shutdown()
+        return blocked, accepted, module.processed
+
+    assert asyncio.run(scenario()) == (True, True, ["a", "b"])
+
+
+def test_timeouts_and_errors_do_not_stop_workers():
+    async def scenario():
+        module = RecordingModule(task_timeout=0.05)
+        module.start_workers()
+        for task in (1.0, None, "ok"):
+            await module.enqueue_task(task)
+        await module.join()
+        await module.shutdown()
+        return module.processed, module.queue_metrics()
+
+    # None 不是数字，直接记录；1.0秒的任务超时被取消
+    processed, metrics = asyncio.run(scenario())
+    assert processed == [None, "ok"]
+    assert metrics["timeouts"] == 1
+    assert metrics["processed"] == 2
+    assert metrics["total_ms"]["max"] >= 50
+
+
+def test_shutdown_drains_queued_tasks():
+    async def scenario():
+        module = RecordingModule(num_workers=2)
+        module.start_workers()
+        for i in range(6):
+            await module.enqueue_task(0.01)
+        await module.shutdown_workers(drain=True)
+        rejected = not await module.enqueue_task("late")
+        return len(module.processed), rejected, module.queue_metrics()
+
+    processed, rejected, metrics = asyncio.run(scenario())
+    assert processed == 6
+    assert rejected
+    assert metrics["workers"] == 0
+    assert metrics["dropped"] == 1
+
+
+def test_shutdown_drops_what_the_drain_timeout_leaves():
+    async def scenario():
+        module = RecordingModule()
+        module.start_workers()
+        for i in range(5):
+            await module.enqueue_task(0.2)
+        await module.shutdown_workers(drain=True, timeout=0.05)
+        return len(module.processed), module.queue_metrics()
+
+    processed, metrics = asyncio.run(scenario())
+    assert processed == 0
+    assert metrics["depth"] == 0
+    assert metrics["dropped"] == 4 # 正在执行的任务被取消，不计入 dropped
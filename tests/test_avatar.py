@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from avatar import create_avatar_module
+from replay_harness import FakeVTSServer
+
+
+def test_hotkey_timeout_does_not_desync_connection(tmp_path):
+    async def scenario():
+        server = FakeVTSServer(["wave"])
+        await server.start()
+        avatar = await create_avatar_module(vts_host=server.host, vts_port=server.port,
+                                            token_path=str(tmp_path / "token.txt"), motion_timeout=0.2)
+        try:
+            avatar.start_workers()
+            # 回复晚于超时到达，被取消的请求已经发出
+            server.response_delay = 0.5
+            await avatar.enqueue_task("wave")
+            await avatar.join()
+            server.response_delay = 0.0
+            await avatar.enqueue_task("wave")
+            await avatar.join()
+            response = await avatar.vts.request(avatar.vts.vts_request.requestHotKeyList())
+            return response["messageType"], avatar.queue_metrics(), len(server.hotkey_triggers)
+        finally:
+            await avatar.shutdown()
+            await server.stop()
+
+    message_type, metrics, triggers = asyncio.run(scenario())
+    assert message_type == "HotkeysInCurrentModelResponse"
+    assert metrics["timeouts"] == 1
+    assert metrics["processed"] == 1
+    assert triggers == 2
+
+
+def test_parameter_stream_rate_is_independent_of_vts_replies(tmp_path):
+    async def scenario():
+        server = FakeVTSServer([], response_delay=0.05)
+        await server.start()
+        avatar = await create_avatar_module(vts_host=server.host, vts_port=server.port,
+                                            token_path=str(tmp_path / "token.txt"), parameter_fps=60)
+        try:
+            avatar.expression.set("MouthOpen", 0.3)
+            avatar.start_parameter_stream()
+            await asyncio.sleep(0.5)
+            await asyncio.sleep(0.1) # 等最后几帧到达
+            return avatar.parameter_stream.stats(), len(server.parameter_injections)
+        finally:
+            await avatar.shutdown()
+            await server.stop()
+
+    stats, received = asyncio.run(scenario())
+    assert stats["frames_busy"] == 0
+    assert stats["fps_actual"] > 50
+    assert received >= 25
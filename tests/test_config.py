@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from config import load_config, validate_config
+from healthcheck import run_checks
+
+
+def write_config(tmp_path, content):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(content), encoding="utf-8")
+    return str(path)
+
+
+def test_numbers_and_ports_accept_equivalent_types(tmp_path):
+    config = load_config(write_config(tmp_path, {
+        "memory": {"milvus_port": 19530, "embedding_batch_size": 16.0},
+        "avatar": {"vts_port": "8001", "parameter_fps": 30, "motion_timeout": 2},
+    }))
+    assert validate_config(config) == []
+
+
+def test_invalid_values_are_reported(tmp_path):
+    config = load_config(write_config(tmp_path, {
+        "memory": {"milvus_port": "70000", "embedding_batch_size": True, "embedding_backend": "nope"},
+        "avatar": {"vts_port": 8001.5},
+    }))
+    errors = validate_config(config)
+    assert "'memory.milvus_port' must be between 1 and 65535." in errors
+    assert "'memory.embedding_batch_size' must be a number." in errors
+    assert "'avatar.vts_port' must be an int or a numeric str." in errors
+    assert any(e.startswith("Unknown embedding backend 'nope'") for e in errors)
+
+
+def test_malformed_configs_are_reported_not_raised(tmp_path):
+    cases = [
+        ({"memory": 5}, "'memory' must be an object."),
+        ({"memory": {"embedding_backend": ["x"]}}, "'memory.embedding_backend' must be str."),
+    ]
+    for content, expected in cases:
+        report = run_checks(write_config(tmp_path, content))
+        assert not report["ok"]
+        assert report["config"]["errors"] == [expected]
+
+    report = run_checks(write_config(tmp_path, ["memory"]))
+    assert not report["ok"]
+    assert "must contain a JSON object" in report["config"]["errors"][0]
@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from healthcheck import check_import_budget
+
+# import core 的耗时预算（秒），留有余量以适应较慢的CI机器
+IMPORT_BUDGET = 1.0
+
+
+def test_import_core_within_budget():
+    result = check_import_budget("core", IMPORT_BUDGET)
+    assert result["ok"], result
+    assert result["heavy_modules_loaded"] == []
+
+
+def test_import_healthcheck_is_lightweight():
+    result = check_import_budget("healthcheck", IMPORT_BUDGET)
+    assert result["ok"], result
+    assert result["heavy_modules_loaded"] == []
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from memory_archive import ColdArchive, compact_raw_vectors
+from sql_storage import SQLiteStorage
+
+SCHEMA = [
+    "CREATE TABLE user_dialogues (id INTEGER PRIMARY KEY AUTOINCREMENT, time INTEGER NOT NULL, "
+    "role TEXT NOT NULL, text TEXT NOT NULL);",
+    "CREATE TABLE summary (id INTEGER PRIMARY KEY AUTOINCREMENT, start_time INTEGER NOT NULL, "
+    "end_time INTEGER NOT NULL, summary_text TEXT NOT NULL, start_id INTEGER, end_id INTEGER);",
+]
+
+
+class FakeCollection:
+    """只实现压缩用到的 query/delete/flush/compact。"""
+    def __init__(self, vectors):
+        self.vectors = dict(vectors)
+
+    def query(self, expr, output_fields):
+        ids = eval(expr.split(" in ")[1])
+        return [{"id": i, "embedding": self.vectors[i]} for i in ids if i in self.vectors]
+
+    def delete(self, expr):
+        for i in eval(expr.split(" in ")[1]):
+            self.vectors.pop(i, None)
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, storage, collection):
+        self.user_id = "tester"
+        self.raw_text_collection = collection
+        self._storage = storage
+
+    def _connect_sql(self):
+        return self._storage
+
+
+def make_client(tmp_path, rows, summaries):
+    storage = SQLiteStorage(str(tmp_path / "user.db")).start()
+    for statement in SCHEMA:
+        storage.write(statement).result()
+    storage.write_many("INSERT INTO user_dialogues (time, role, text) VALUES (?, 'user', ?);",
+                       [(t, f"message {i}") for i, t in enumerate(rows)]).result()
+    storage.write_many("INSERT INTO summary (start_time, end_time, summary_text, start_id, end_id) "
+                       "VALUES (?, ?, 'summary', ?, ?);", summaries).result()
+    collection = FakeCollection({i: [float(i), 1.0, 0.0, 0.0] for i in range(1, len(rows) + 1)})
+    return FakeClient(storage, collection), storage
+
+
+def test_compaction_only_archives_ids_covered_by_a_summary(tmp_path):
+    # id 1-3 已被总结；id 4-6 是之后批量导入的历史记录，时间更早但不在任何摘要区间内
+    client, storage = make_client(tmp_path, [100, 200, 300, 50, 60, 70], [(100, 300, 1, 3)])
+    archive = ColdArchive(str(tmp_path / "archive"), dim=4)
+    try:
+        stats = compact_raw_vectors(client, archive, min_age_seconds=0, keep_recent=0)
+        assert stats["moved"] == 3
+        assert archive.contains([1, 2, 3, 4, 5, 6]).tolist() == [True] * 3 + [False] * 3
+        assert sorted(client.raw_text_collection.vectors) == [4, 5, 6]
+
+        # 导入的记录被总结之后，下一轮压缩归档它们，已归档的id不会重复归档
+        storage.write("INSERT INTO summary (start_time, end_time, summary_text, start_id, end_id) "
+                      "VALUES (50, 70, 'summary', 4, 6);").result()
+        stats = compact_raw_vectors(client, archive, min_age_seconds=0, keep_recent=0)
+        assert stats["moved"] == 3
+        assert len(archive) == 6
+        assert sorted(np.asarray(archive._load()[0]).tolist()) == [1, 2, 3, 4, 5, 6]
+    finally:
+        storage.close()
+
+
+def test_compaction_keeps_recent_and_unsummarized_rows(tmp_path):
+    client, storage = make_client(tmp_path, [100, 200, 300, 400], [(100, 200, 1, 2)])
+    archive = ColdArchive(str(tmp_path / "archive"), dim=4)
+    try:
+        stats = compact_raw_vectors(client, archive, min_age_seconds=0, keep_recent=3)
+        assert stats["moved"] == 1
+        assert sorted(client.raw_text_collection.vectors) == [2, 3, 4]
+    finally:
+        storage.close()
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from parameter_stream import ParameterStream, StaticProducer
+
+
+def run_stream(send, duration=0.5, fps=60.0):
+    async def scenario():
+        producer = StaticProducer()
+        producer.set("MouthOpen", 0.5)
+        stream = ParameterStream(send, fps=fps, producers=[producer])
+        task = asyncio.create_task(stream.run())
+        await asyncio.sleep(duration)
+        stream.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return stream.stats()
+    return asyncio.run(scenario())
+
+
+def test_slow_send_does_not_slow_the_clock():
+    async def slow_send(values):
+        await asyncio.sleep(0.05)
+
+    stats = run_stream(slow_send)
+    assert stats["fps_actual"] > 50
+    assert stats["frames_dropped"] <= 2
+    assert stats["frames_busy"] > stats["frames_sent"]
+
+
+def test_hung_send_does_not_stop_the_clock():
+    async def hung_send(values):
+        await asyncio.Event().wait()
+
+    stats = run_stream(hung_send)
+    assert stats["frames_sent"] == 0
+    assert stats["frames_busy"] > 20
+    assert stats["fps_actual"] > 50
+
+
+def test_fast_send_sends_every_frame():
+    sent = []
+
+    async def send(values):
+        sent.append(values)
+
+    stats = run_stream(send)
+    assert stats["frames_busy"] == 0
+    assert len(sent) == stats["frames_sent"] > 20
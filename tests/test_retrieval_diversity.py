@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from retrieval_diversity import collapse_windows, mmr_select, window_overlap
+
+
+def hit(id, distance):
+    return {"id": id, "distance": distance}
+
+
+def test_window_overlap():
+    assert window_overlap(10, 10) == 1.0
+    assert window_overlap(10, 12) == 0.6
+    assert window_overlap(10, 15) == 0.0
+
+
+def test_mmr_select_skips_neighbouring_windows():
+    hits = [hit(10, 0.90), hit(11, 0.89), hit(12, 0.88), hit(40, 0.80)]
+    assert [h["id"] for h in mmr_select(hits, top_k=2, diversity=0.0)] == [10, 11]
+    assert [h["id"] for h in mmr_select(hits, top_k=2, diversity=0.3)] == [10, 40]
+    assert len(mmr_select(hits, top_k=10)) == 4
+
+
+def test_collapse_windows_merges_overlapping_hits_into_spans():
+    hits = [hit(12, 0.7), hit(10, 0.6), hit(40, 0.9), hit(16, 0.8), hit(3, 0.5)]
+    spans = collapse_windows(hits, window_size=5)
+    assert [(s["start_id"], s["end_id"]) for s in spans] == [(36, 40), (6, 16), (1, 3)]
+    assert spans[1]["hit_ids"] == [10, 12, 16]
+    assert spans[1]["id"] == 16 and spans[1]["distance"] == 0.8
+
+
+def test_collapse_windows_keeps_adjacent_windows_separate():
+    # 窗口 [6, 10] 和 [11, 15] 相邻但不重叠
+    spans = collapse_windows([hit(10, 0.5), hit(15, 0.4)], window_size=5)
+    assert [(s["start_id"], s["end_id"]) for s in spans] == [(6, 10), (11, 15)]
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sql_storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "test.db")).start()
+    storage.write("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);").result()
+    yield storage
+    storage.close()
+
+
+def hold_writer(storage):
+    """让写线程停在一个事务中，返回用于放行的Event，期间提交的写操作在队列中积压。"""
+    started, release = threading.Event(), threading.Event()
+
+    def wait(conn):
+        started.set()
+        release.wait()
+    storage.run_in_writer(wait)
+    started.wait()
+    return release
+
+
+def test_queued_writes_share_one_commit(storage):
+    release = hold_writer(storage)
+    commits = storage.commit_count
+    futures = [storage.write("INSERT INTO items (name) VALUES (?);", (f"item {i}",)) for i in range(50)]
+    release.set()
+    ids = [f.result() for f in futures]
+    assert ids == list(range(1, 51))
+    assert storage.commit_count == commits + 2 # 被阻塞的函数一次，积压的50条语句一次
+    assert storage.read_one("SELECT COUNT(*) AS n FROM items;")["n"] == 50
+
+
+def test_failing_statement_does_not_affect_its_group(storage):
+    release = hold_writer(storage)
+    first = storage.write("INSERT INTO items (name) VALUES (?);", ("a",))
+    duplicate = storage.write("INSERT INTO items (name) VALUES (?);", ("a",))
+    many = storage.write_many("INSERT INTO items (name) VALUES (?);", [("b",), ("c",)])
+    release.set()
+    assert first.result() == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result()
+    assert many.result() == 2
+    assert [row["name"] for row in storage.read("SELECT name FROM items ORDER BY id;")] == ["a", "b", "c"]
+
+
+def test_failing_function_rolls_back(storage):
+    def insert_then_fail(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('x');")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        storage.run_in_writer(insert_then_fail).result()
+    assert storage.read("SELECT name FROM items;") == []
+
+
+def test_writes_after_close_are_rejected(storage):
+    storage.write("INSERT INTO items (name) VALUES ('a');").result()
+    storage.close()
+    with pytest.raises(RuntimeError):
+        storage.write("INSERT INTO items (name) VALUES ('b');")